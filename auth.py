@@ -0,0 +1,63 @@
+"""Team membership checks shared by the team routes.
+
+Memberships found in the database are kept by the worker for MEMBERSHIP_TTL seconds, so
+most requests skip the query on team.members (which has a GIN index). Only memberships
+are kept, never their absence, so removing a member or deleting a team must forget them.
+Other workers forget them when the TTL runs out.
+"""
+from functools import wraps
+from os import getenv
+from time import monotonic
+
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select
+
+from models import db, Team
+
+
+MEMBERSHIP_TTL = int(getenv("MEMBERSHIP_TTL", 60))
+
+memberships = {}
+
+
+def is_member(account_id, team_id):
+    """Returns whether the account is a member of the team."""
+    key = (account_id, str(team_id))
+    if memberships.get(key, 0) > monotonic():
+        return True
+    if db.session.execute(select(Team.team_id).where(
+            Team.members.contains([account_id]) & (Team.team_id == team_id))).scalar() is None:
+        return False
+    memberships[key] = monotonic() + MEMBERSHIP_TTL
+    return True
+
+
+def member_teams(account_id, team_ids):
+    """Returns those of the team ids that the account is a member of, querying the memberships not kept at once."""
+    now = monotonic()
+    found = {team_id for team_id in team_ids if memberships.get((account_id, str(team_id)), 0) > now}
+    missing = set(team_ids) - found
+    if missing:
+        for team_id in db.session.execute(select(Team.team_id).where(
+                Team.members.contains([account_id]) & Team.team_id.in_(missing))).scalars():
+            memberships[(account_id, str(team_id))] = now + MEMBERSHIP_TTL
+            found.add(team_id)
+    return found
+
+
+def forget(team_id=None, account_id=None):
+    """Forgets the memberships of a team, of an account, or of an account in a team."""
+    for key in [key for key in memberships if team_id is None or key[1] == str(team_id)]:
+        if account_id is None or key[0] == account_id:
+            del memberships[key]
+
+
+def member_required(view):
+    """Returns a 404 unless the account of the json web token is a member of the team_id of the route."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_member(get_jwt_identity(), kwargs["team_id"]):
+            return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
+        return view(*args, **kwargs)
+    return wrapper
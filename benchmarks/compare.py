@@ -0,0 +1,51 @@
+"""Compares two results files of the same benchmark, such as runs on two commits, and exits
+with status 1 if any time, memory peak or query count grew by more than the threshold.
+
+Run from the root of the repository with ``python -m benchmarks.compare before.json after.json``.
+"""
+from argparse import ArgumentParser
+from sys import exit
+
+from benchmarks.results import read
+
+
+METRICS = ("median_ms", "max_ms", "p50_ms", "p90_ms", "p99_ms", "peak_bytes", "queries")
+
+
+def compare(before, after, threshold):
+    """Prints the change in each metric of the rows found in both results, and returns the names and metrics that
+       grew by more than threshold, a fraction."""
+    if before["benchmark"] != after["benchmark"]:
+        raise ValueError(f"Cannot compare {before['benchmark']} results with {after['benchmark']} results")
+    previous = {row["name"]: row for row in before["rows"]}
+    regressions = []
+    print(f"{before['benchmark']}: {before['commit']} -> {after['commit']}")
+    print(f"{'name':>48} {'metric':>10} {'before':>12} {'after':>12} {'change':>8}")
+    for row in after["rows"]:
+        if row["name"] not in previous:
+            continue
+        for metric in METRICS:
+            old, new = previous[row["name"]].get(metric), row.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0 if new == old else float("inf")
+            flag = " !" if change > threshold else ""
+            if change > threshold:
+                regressions.append((row["name"], metric))
+            print(f"{row['name']:>48} {metric:>10} {old:>12.2f} {new:>12.2f} {change:>+8.0%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares two benchmark results files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the largest growth allowed, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+    try:
+        found = compare(read(args.before), read(args.after), args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+    if found:
+        print(f"{len(found)} regressions above {args.threshold:.0%}")
+        exit(1)
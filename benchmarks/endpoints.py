@@ -0,0 +1,106 @@
+"""Drives the app end to end with its test client, reporting the latency percentiles and SQL
+statements of each endpoint.
+
+Each round registers an account, logs in, registers a team, adds the players, adds a match,
+sets its pool, calculates the teams, fetches the team and match and declares a winner. The
+models use Postgres arrays, so SQLite cannot stand in: the database is given with --database
+or SQLALCHEMY_DATABASE_URI, its tables are created if missing and every round adds rows to it,
+so use a scratch database.
+
+Run from the root of the repository with ``python -m benchmarks.endpoints``.
+"""
+from argparse import ArgumentParser
+from os import environ
+from random import Random
+from time import perf_counter
+from uuid import uuid4
+
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+
+from benchmarks.results import save
+
+
+def percentile(values, q):
+    """Returns the value below which q percent of the values fall, by nearest rank."""
+    values = sorted(values)
+    return values[round(q / 100 * (len(values) - 1))]
+
+
+def run(rounds, pool_size, seed):
+    from main import app
+    from models import db, Match
+    statements = [0]
+    timings, counts = {}, {}
+
+    def count(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        db.engine.echo = False
+        db.create_all()
+        event.listen(db.engine, "before_cursor_execute", count)
+    client = app.test_client()
+    rng = Random(seed)
+    tag = uuid4().hex[:8]
+
+    def call(name, url, body=None):
+        method, _ = name.split(" ", 1)
+        before = statements[0]
+        start = perf_counter()
+        response = client.open(url, method=method, json=body)
+        timings.setdefault(name, []).append((perf_counter() - start) * 1000)
+        counts.setdefault(name, []).append(statements[0] - before)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    for number in range(rounds):
+        email = f"benchmark-{tag}-{number}@example.com"
+        call("POST /register", "/register", {"email": email, "password": "benchmark"})
+        call("POST /login", "/login", {"email": email, "password": "benchmark"})
+        call("POST /register-team", "/register-team", {"name": f"benchmark-{tag}-{number}"})
+        team_id = call("GET /account", "/account")[1]["teams"][0]["team_id"]
+        for i in range(pool_size):
+            rating = rng.randint(30, 70) / 10
+            call("POST /team/<team_id>/add-player", f"/team/{team_id}/add-player",
+                 {"name": f"player-{i}", "initial_rating": rating, "current_rating": rating})
+        call("POST /team/<team_id>/add-match", f"/team/{team_id}/add-match", {"date": "2024-01-01"})
+        with app.app_context():
+            match_id = db.session.execute(select(Match.match_id).filter_by(team=team_id)).scalar()
+        players = [player["player_id"] for player in call("GET /team/<team_id>", f"/team/{team_id}")["players"]]
+        call("PATCH /team/<team_id>/<match_id>/update-pool", f"/team/{team_id}/{match_id}/update-pool",
+             {"pool": players})
+        call("PATCH /team/<team_id>/<match_id>/calculate-teams", f"/team/{team_id}/{match_id}/calculate-teams",
+             {"seed": seed + number})
+        call("GET /team/<team_id>/<match_id>", f"/team/{team_id}/{match_id}")
+        call("PATCH /team/<team_id>/<match_id>/declare-winner", f"/team/{team_id}/{match_id}/declare-winner",
+             {"winner": rng.randint(0, 1)})
+
+    rows = []
+    print(f"{'endpoint':>48} {'calls':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, times in timings.items():
+        row = {"name": name, "calls": len(times), "p50_ms": round(percentile(times, 50), 3),
+               "p90_ms": round(percentile(times, 90), 3), "p99_ms": round(percentile(times, 99), 3),
+               "queries": sum(counts[name]) / len(counts[name])}
+        rows.append(row)
+        print(f"{name:>48} {row['calls']:>6} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['queries']:>8.1f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Times each endpoint of the app end to end.")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", help="a Postgres URI (SQLALCHEMY_DATABASE_URI if not given)")
+    parser.add_argument("--output", help="a json file to write the results to")
+    args = parser.parse_args()
+    load_dotenv()
+    if args.database:
+        environ["SQLALCHEMY_DATABASE_URI"] = args.database
+    environ.setdefault("SECRET_KEY", uuid4().hex)
+    results = run(args.rounds, args.pool_size, args.seed)
+    if args.output:
+        save(args.output, "endpoints", {**vars(args), "database": None}, results)
@@ -0,0 +1,87 @@
+"""Times line-up generation, scoring and each engine across pool sizes, with the peak memory of each.
+
+Times are the median of the repeats, with the line-up tables already cached. The peak is traced
+by tracemalloc over one more run after clearing the table cache, so it includes building the
+table. The parallel engine only reports the memory of the parent process. Each step is skipped
+above the pool size in MAX_POOL_SIZES, past which it takes too long to time.
+
+Run from the root of the repository with ``python -m benchmarks.engines``.
+"""
+from argparse import ArgumentParser
+from random import Random
+from statistics import median
+from time import perf_counter
+import tracemalloc
+
+import engines
+import tables
+from benchmarks.results import save
+
+
+MAX_POOL_SIZES = {
+    'generate': tables.MAX_POOL_SIZE,
+    'score': 26,
+    'brute-force': 22,
+    'vectorized': 26,
+    'meet-in-the-middle': 40,
+    'counting': 40,
+    'streaming': 22,
+    'parallel': 24,
+}
+
+
+def measure(function, repeats):
+    """Returns the median milliseconds of function over repeats runs and the peak bytes it allocates."""
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        times.append((perf_counter() - start) * 1000)
+    tables.cache.clear()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return median(times), peak
+
+
+def steps(ratings, seed):
+    """Returns the name and function of each step for a pool of the given ratings."""
+    pool_size = len(ratings)
+    found = {'generate': lambda: tables.generate(pool_size),
+             'score': lambda: engines.score(tables.options(pool_size), ratings)}
+    for name in engines.ENGINES:
+        found[name] = lambda name=name: engines.solve(ratings, name, seed)
+    return found
+
+
+def run(pool_sizes, step_names, repeats, seed):
+    rng = Random(seed)
+    rows = []
+    print(f"{'step':>18} {'pool':>5} {'options':>10} {'median ms':>10} {'peak MiB':>9}")
+    for pool_size in pool_sizes:
+        ratings = [rng.randint(30, 70) for _ in range(pool_size)]
+        for name, function in steps(ratings, seed).items():
+            if name not in step_names or pool_size > MAX_POOL_SIZES[name]:
+                continue
+            elapsed, peak = measure(function, repeats)
+            rows.append({"name": f"{name}/{pool_size}", "step": name, "pool_size": pool_size,
+                         "median_ms": round(elapsed, 3), "peak_bytes": peak})
+            print(f"{name:>18} {pool_size:>5} {engines.total_options(pool_size):>10} {elapsed:>10.2f} "
+                  f"{peak / 2 ** 20:>9.1f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Times line-up generation, scoring and each engine.")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=list(range(2, 42, 2)))
+    parser.add_argument("--steps", nargs="+", default=list(MAX_POOL_SIZES), choices=list(MAX_POOL_SIZES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="a json file to write the results to")
+    args = parser.parse_args()
+    results = run(args.pool_sizes, args.steps, args.repeats, args.seed)
+    if args.output:
+        save(args.output, "engines", vars(args), results)
@@ -0,0 +1,48 @@
+"""Times the multi-team partitioner across pool sizes and numbers of teams.
+
+Run from the root of the repository with ``python -m benchmarks.multiteam``.
+"""
+from argparse import ArgumentParser
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from multiteam import partition
+from benchmarks.results import save
+
+
+def run(pool_sizes, teams, repeats, seed):
+    rng = Random(seed)
+    rows = []
+    print(f"{'teams':>5} {'pool':>5} {'median ms':>10} {'max ms':>8} {'spread':>7} {'exact':>6}")
+    for k in teams:
+        for pool_size in pool_sizes:
+            if pool_size % k:
+                continue
+            times, spreads, exact = [], [], 0
+            for _ in range(repeats):
+                ratings = [rng.randint(30, 70) for _ in range(pool_size)]
+                start = perf_counter()
+                found = partition(ratings, k)
+                times.append((perf_counter() - start) * 1000)
+                spreads.append(found.spread)
+                exact += found.exact
+            rows.append({"name": f"{k}/{pool_size}", "teams": k, "pool_size": pool_size,
+                         "median_ms": round(median(times), 3), "max_ms": round(max(times), 3),
+                         "spread": median(spreads) / 10, "exact": exact / repeats})
+            print(f"{k:>5} {pool_size:>5} {median(times):>10.2f} {max(times):>8.2f} {median(spreads) / 10:>7.1f} "
+                  f"{exact / repeats:>6.0%}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Times the multi-team partitioner.")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[12, 16, 18, 20, 24, 28, 30, 32, 36, 40])
+    parser.add_argument("--teams", type=int, nargs="+", default=[3, 4])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="a json file to write the results to")
+    args = parser.parse_args()
+    results = run(args.pool_sizes, args.teams, args.repeats, args.seed)
+    if args.output:
+        save(args.output, "multiteam", vars(args), results)
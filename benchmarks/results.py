@@ -0,0 +1,30 @@
+"""Reads and writes benchmark results as json, so runs on different commits can be compared
+with ``python -m benchmarks.compare``.
+"""
+from datetime import datetime, timezone
+from json import dump, load
+from platform import python_version
+from subprocess import run
+
+
+def commit():
+    """Returns the short hash of the checked out commit, or None outside a git repository."""
+    try:
+        found = run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return found.stdout.strip() or None
+
+
+def save(path, benchmark, options, rows):
+    """Writes the rows of a benchmark, each a dict with a unique name, with the options and commit they came from."""
+    with open(path, "w") as file:
+        dump({"benchmark": benchmark, "commit": commit(), "python": python_version(),
+              "created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "options": options,
+              "rows": rows}, file, indent=2)
+        file.write("\n")
+
+
+def read(path):
+    with open(path) as file:
+        return load(file)
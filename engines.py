@@ -0,0 +1,569 @@
+"""Engines that search a pool for the fairest pair of teams.
+
+A line-up is an int mask over the pool: bit ``i`` set puts player ``i`` in team1 and
+bit ``i`` clear puts them in team0. The last player of the pool is always in team0, so
+each split of the pool is only counted once. Ratings are given in tenths as ints so
+that equal differences compare exactly.
+"""
+from bisect import bisect_left
+from collections import namedtuple
+from decimal import Decimal
+from math import comb
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os import cpu_count, getenv
+from random import Random
+from time import time
+import numpy as np
+from metrics import phase
+import tables
+
+
+Solution = namedtuple('Solution', ['total', 'parsed', 'difference', 'mask', 'coverage'], defaults=[1.0])
+Solution.__doc__ = """The result of a search: the number of line-ups in the pool, the number of
+                      fairest line-ups, their difference in tenths, one of them picked at random and
+                      the fraction of the line-ups that were searched."""
+
+CUTOVER = 12
+MAX_COUNTING_CELLS = 2 * 10 ** 7
+SEARCH_WORKERS = int(getenv('SEARCH_WORKERS', cpu_count() or 1))
+SHARDS_PER_WORKER = 4
+SUBSET_MICROSECONDS = 4
+MAX_SCAN_POOL_SIZE = 24
+
+
+def tenths(rating):
+    """Returns a rating such as Decimal('4.9') as an int number of tenths."""
+    return round(Decimal(rating) * 10)
+
+
+def total_options(pool_size):
+    """Returns the number of line-ups for a pool of the given (even) size."""
+    return comb(pool_size - 1, pool_size // 2)
+
+
+def brute_force(ratings, rng):
+    """Scores every line-up of the pool one bit at a time."""
+    pool_size = len(ratings)
+    if pool_size > MAX_SCAN_POOL_SIZE:
+        raise ValueError(f'Brute force can only search pools of up to {MAX_SCAN_POOL_SIZE} players')
+    with phase('brute-force', 'enumeration'):
+        options = tables.options(pool_size).tolist()
+    total = sum(ratings)
+    differences = []
+    with phase('brute-force', 'scoring'):
+        for integer in options:
+            team1 = 0
+            for i in range(pool_size):
+                if (integer >> i) & 1:
+                    team1 += ratings[i]
+            differences.append(abs(total - 2 * team1))
+    difference = min(differences)
+    parsed = [options[i] for i in range(len(options)) if differences[i] == difference]
+    return Solution(len(options), len(parsed), difference, rng.choice(parsed))
+
+
+def score(options, ratings):
+    """Returns the differences of the given line-ups as an int64 array, adding each player's
+       rating to the team1 rating of the line-ups that have their bit set."""
+    team1 = np.zeros(len(options), dtype=np.int64)
+    for i, rating in enumerate(ratings):
+        team1 += ((options >> i) & 1).astype(np.int64) * rating
+    return np.abs(sum(ratings) - 2 * team1)
+
+
+def vectorized(ratings, rng):
+    """Scores every line-up of the pool at once with numpy."""
+    with phase('vectorized', 'enumeration'):
+        options = tables.options(len(ratings))
+    with phase('vectorized', 'scoring'):
+        differences = score(options, ratings)
+    difference = differences.min()
+    parsed = np.flatnonzero(differences == difference)
+    return Solution(len(options), len(parsed), int(difference), int(options[parsed[rng.randrange(len(parsed))]]))
+
+
+def vectorized_many(pools, seeds):
+    """Returns the Solution of the vectorized engine for each of the pools, which are all the same size, with
+       the seed at the same position. The line-ups are scored for every pool at once, as the product of the
+       table of their bits and the matrix of the ratings."""
+    pool_size = len(pools[0])
+    with phase('vectorized', 'enumeration'):
+        options = tables.options(pool_size)
+        bits = ((options[:, None] >> np.arange(pool_size, dtype=np.uint32)) & 1).astype(np.int64)
+    with phase('vectorized', 'scoring'):
+        ratings = np.array(pools, dtype=np.int64)
+        differences = np.abs(ratings.sum(axis=1) - 2 * (bits @ ratings.T))
+    best = differences.min(axis=0)
+    solutions = []
+    for column, seed in enumerate(seeds):
+        parsed = np.flatnonzero(differences[:, column] == best[column])
+        solutions.append(Solution(len(options), len(parsed), int(best[column]),
+                                  int(options[parsed[Random(seed).randrange(len(parsed))]])))
+    return solutions
+
+
+def revolving_door(elements, size):
+    """Yields every combination of size elements of range(elements) after the first, range(size),
+       as the (removed, added) pair of elements that turns the previous combination into the next.
+       This is Knuth's revolving-door algorithm (TAOCP 7.2.1.3, algorithm R)."""
+    if size == 0 or size == elements:
+        return
+    if size == 1:
+        for element in range(1, elements):
+            yield element - 1, element
+        return
+    c = [None, *range(size), elements]
+    while True:
+        if size % 2:
+            if c[1] + 1 < c[2]:
+                yield c[1], c[1] + 1
+                c[1] += 1
+                continue
+            j, increase = 2, False
+        else:
+            if c[1] > 0:
+                yield c[1], c[1] - 1
+                c[1] -= 1
+                continue
+            j, increase = 2, True
+        while j <= size:
+            if not increase:
+                if c[j] >= j:
+                    yield c[j], j - 2
+                    c[j], c[j - 1] = c[j - 1], j - 2
+                    break
+                j += 1
+            elif c[j] + 1 < c[j + 1]:
+                yield j - 2, c[j] + 1
+                c[j - 1], c[j] = c[j], c[j] + 1
+                break
+            else:
+                j += 1
+            increase = not increase
+        else:
+            return
+
+
+def scan(ratings, players, size, mask, team1, rng, deadline=None):
+    """Walks every way of adding size of the first players of the pool to team1 in revolving-door
+       order, on top of the given team1 mask and rating. Each line-up swaps one player between the
+       teams, so its difference is updated in constant time, and the line-up returned is sampled
+       from the fairest line-ups as they are found. Stops early once time() passes the deadline.
+       Returns the difference, number and sampled mask of the fairest line-ups found, and the
+       number of line-ups scanned."""
+    total = sum(ratings)
+    mask |= (1 << size) - 1
+    team1 += sum(ratings[:size])
+    difference, parsed, chosen, scanned = abs(total - 2 * team1), 1, mask, 1
+    for removed, added in revolving_door(players, size):
+        if deadline is not None and scanned % 4096 == 0 and time() > deadline:
+            break
+        mask ^= (1 << removed) | (1 << added)
+        team1 += ratings[added] - ratings[removed]
+        scanned += 1
+        option = abs(total - 2 * team1)
+        if option < difference:
+            difference, parsed, chosen = option, 1, mask
+        elif option == difference:
+            parsed += 1
+            if rng.randrange(parsed) == 0:
+                chosen = mask
+    return difference, parsed, chosen, scanned
+
+
+def streaming(ratings, rng):
+    """Walks the line-ups in revolving-door order without building a table of them, so memory
+       does not grow with the pool."""
+    pool_size = len(ratings)
+    if pool_size > MAX_SCAN_POOL_SIZE:
+        raise ValueError(f'Line-ups can only be streamed for pools of up to {MAX_SCAN_POOL_SIZE} players')
+    difference, parsed, chosen, _ = scan(ratings, pool_size - 1, pool_size // 2, 0, 0, rng)
+    return Solution(total_options(pool_size), parsed, difference, chosen)
+
+
+def shards(pool_size, count):
+    """Returns about count shards of the line-ups of a pool as (mask, players, size): the mask of the
+       leading players placed in team1 by the shard, the number of remaining players and how many
+       of them join team1."""
+    leading = min(max(count - 1, 1).bit_length(), pool_size - 2)
+    players = pool_size - 1 - leading
+    team_size = pool_size // 2
+    return [(prefix << players, players, team_size - prefix.bit_count()) for prefix in range(1 << leading)
+            if 0 <= team_size - prefix.bit_count() <= players]
+
+
+def search_shard(ratings, mask, players, size, seed, deadline):
+    """Searches one shard of the line-ups of a pool in a worker process."""
+    team1 = sum(rating for i, rating in enumerate(ratings) if (mask >> i) & 1)
+    return scan(ratings, players, size, mask, team1, Random(seed), deadline)
+
+
+executor = None
+
+
+def parallel(ratings, rng, time_budget_ms=None):
+    """Shards the line-ups by the teams of the leading players of the pool and searches the shards
+       across SEARCH_WORKERS processes, merging the fairest line-ups of each shard. If a time budget
+       is given, each shard stops when it runs out and the fairest line-up found so far is returned
+       with the fraction of the line-ups searched. With one search worker, as in the processes of the
+       job worker, the shards are searched in turn in this process, each with an equal share of the
+       time budget. Pools larger than MAX_SCAN_POOL_SIZE need a time budget."""
+    global executor
+    pool_size = len(ratings)
+    if time_budget_ms is None and pool_size > MAX_SCAN_POOL_SIZE:
+        raise ValueError(f'Pools of more than {MAX_SCAN_POOL_SIZE} players can only be searched in parallel with a '
+                         f'time budget')
+    start = time()
+    found = shards(pool_size, SEARCH_WORKERS * SHARDS_PER_WORKER)
+    if SEARCH_WORKERS == 1:
+        results = [search_shard(ratings, *shard, rng.getrandbits(64), None if time_budget_ms is None else
+                                start + time_budget_ms / 1000 * (i + 1) / len(found)) for i, shard in enumerate(found)]
+    else:
+        if executor is None:
+            executor = ProcessPoolExecutor(SEARCH_WORKERS)
+        deadline = start + time_budget_ms / 1000 if time_budget_ms is not None else None
+        futures = [executor.submit(search_shard, ratings, *shard, rng.getrandbits(64), deadline) for shard in found]
+        results = [future.result() for future in futures]
+    difference = min(result[0] for result in results)
+    fairest = [(parsed, chosen) for option, parsed, chosen, _ in results if option == difference]
+    index = rng.randrange(sum(parsed for parsed, _ in fairest))
+    for parsed, chosen in fairest:
+        if index < parsed:
+            break
+        index -= parsed
+    total = total_options(pool_size)
+    return Solution(total, sum(parsed for parsed, _ in fairest), difference, chosen,
+                    sum(result[3] for result in results) / total)
+
+
+def subset_sums(ratings, offset=0):
+    """Returns a dict of subset size to a list of (sum, mask) for every subset of the ratings,
+       with the masks shifted left by offset."""
+    sums = {0: [(0, 0)]}
+    for i, rating in enumerate(ratings):
+        bit = 1 << (i + offset)
+        for size in range(i, -1, -1):
+            sums.setdefault(size + 1, []).extend((total + rating, mask | bit) for total, mask in sums[size])
+    return sums
+
+
+def meet_in_the_middle(ratings, rng):
+    """Splits the pool in half, enumerates the subset sums of each half and pairs every subset
+       of the first half with the subsets of the second half whose sums bring team1 closest to
+       half of the pool's rating."""
+    pool_size = len(ratings)
+    half = (pool_size - 1) // 2
+    with phase('meet-in-the-middle', 'enumeration'):
+        left = subset_sums(ratings[:half])
+        right = index_sums(subset_sums(ratings[half:pool_size - 1], half))
+    with phase('meet-in-the-middle', 'scoring'):
+        difference, candidates = fairest_pairs(left, right, sum(ratings), pool_size // 2)
+    parsed, mask = sample_pair(candidates, rng)
+    return Solution(total_options(pool_size), parsed, difference, mask)
+
+
+def index_sums(sums):
+    """Returns the subset sums of a half of the pool as a dict of subset size to its sorted sums
+       and a dict of sum to masks."""
+    index = {}
+    for size, subsets in sums.items():
+        masks = {}
+        for total, mask in subsets:
+            masks.setdefault(total, []).append(mask)
+        index[size] = (sorted(masks), masks)
+    return index
+
+
+def fairest_pairs(left, right, total, team_size):
+    """Finds the fairest line-ups from the subset sums of the left half of the pool and the indexed
+       subset sums of the right half. Returns their difference and a list of (left mask, right masks)."""
+    difference = None
+    candidates = []
+    for size, subsets in left.items():
+        if team_size - size not in right:
+            continue
+        sums, masks = right[team_size - size]
+        for left_total, left_mask in subsets:
+            target = total - 2 * left_total
+            position = bisect_left(sums, target // 2)
+            for right_total in sums[max(position - 1, 0):position + 2]:
+                option = abs(target - 2 * right_total)
+                if difference is None or option < difference:
+                    difference = option
+                    candidates = []
+                if option == difference:
+                    candidates.append((left_mask, masks[right_total]))
+    return difference, candidates
+
+
+def sample_pair(candidates, rng, shift=0):
+    """Returns the number of line-ups of the fairest pairs and the mask of one of them picked at
+       random, with the right masks shifted left by shift."""
+    parsed = sum(len(right_masks) for _, right_masks in candidates)
+    index = rng.randrange(parsed)
+    for left_mask, right_masks in candidates:
+        if index < len(right_masks):
+            return parsed, left_mask | right_masks[index] << shift
+        index -= len(right_masks)
+
+
+def counting_cells(ratings, team_size):
+    """Returns the number of cells in the counting table of the given relative ratings."""
+    width = sum(sorted(ratings)[-team_size:]) + 1 if team_size else 1
+    return (len(ratings) + 1) * (team_size + 1) * width
+
+
+def counting_table(ratings, team_size):
+    """Returns counts where counts[i, k, s] is the number of ways to pick k of the first i ratings
+       with a sum of s, with the ratings given relative to the lowest so the sums start at 0."""
+    if counting_cells(ratings, team_size) > MAX_COUNTING_CELLS:
+        raise ValueError('The ratings of the pool are too far apart to count its line-ups')
+    width = sum(sorted(ratings)[-team_size:]) + 1 if team_size else 1
+    counts = np.zeros((len(ratings) + 1, team_size + 1, width), dtype=np.int64)
+    counts[0, 0, 0] = 1
+    for i, rating in enumerate(ratings):
+        counts[i + 1] = counts[i]
+        counts[i + 1, 1:, rating:] += counts[i, :-1, :width - rating]
+    return counts
+
+
+def counting(ratings, rng):
+    """Counts the line-ups of each team1 rating with a subset-sum dynamic program over the players,
+       team size and rating, then draws a fairest line-up uniformly by walking the table back from
+       its team1 rating. Neither step lists the fairest line-ups."""
+    pool_size = len(ratings)
+    if pool_size > 64:
+        raise ValueError('Line-ups can only be counted for pools of up to 64 players')
+    team_size = pool_size // 2
+    lowest = min(ratings[:-1])
+    relative = [rating - lowest for rating in ratings[:-1]]
+    with phase('counting', 'enumeration'):
+        counts = counting_table(relative, team_size)
+    with phase('counting', 'scoring'):
+        sums = np.flatnonzero(counts[-1, team_size])
+        differences = np.abs(sum(ratings) - 2 * (sums + team_size * lowest))
+    difference = differences.min()
+    fairest = [(int(counts[-1, team_size, total]), int(total)) for total in sums[differences == difference]]
+    parsed = sum(count for count, _ in fairest)
+    index = rng.randrange(parsed)
+    for count, total in fairest:
+        if index < count:
+            break
+        index -= count
+    return Solution(total_options(pool_size), parsed, int(difference), counted_sample(counts, relative, team_size,
+                                                                                       total, rng))
+
+
+def counted_sample(counts, ratings, size, total, rng):
+    """Returns the mask of a uniformly random way to pick size of the players of the counting table
+       with the given sum, walking the table back from its last player."""
+    mask = 0
+    for i in range(len(ratings), 0, -1):
+        rating = ratings[i - 1]
+        if size and total >= rating and rng.randrange(counts[i, size, total]) < counts[i - 1, size - 1, total - rating]:
+            mask |= 1 << (i - 1)
+            size -= 1
+            total -= rating
+    return mask
+
+
+def counted_subsets(counts, ratings, players, size, total, mask=0):
+    """Yields the masks of every way to pick size of the first players of the counting table
+       with the given sum, following only the branches of the table that have line-ups."""
+    if players == 0:
+        yield mask
+        return
+    rating = ratings[players - 1]
+    if size and total >= rating and counts[players - 1, size - 1, total - rating]:
+        yield from counted_subsets(counts, ratings, players - 1, size - 1, total - rating, mask | 1 << (players - 1))
+    if counts[players - 1, size, total]:
+        yield from counted_subsets(counts, ratings, players - 1, size, total, mask)
+
+
+def top_k(ratings, k):
+    """Returns an iterator of the k fairest line-ups of the pool as (difference, mask), fairest first.
+       When the counting table fits, the line-ups of each team1 rating are listed from it in order of
+       difference, so each is final as soon as it is yielded. Otherwise every line-up is scored with
+       numpy, if the pool has a table. Raises ValueError for pools with neither, whose line-ups are too
+       many to score."""
+    pool_size = len(ratings)
+    team_size = pool_size // 2
+    lowest = min(ratings[:-1])
+    relative = [rating - lowest for rating in ratings[:-1]]
+    if pool_size <= 64 and counting_cells(relative, team_size) <= MAX_COUNTING_CELLS:
+        counts = counting_table(relative, team_size)
+        sums = np.flatnonzero(counts[-1, team_size])
+        differences = np.abs(sum(ratings) - 2 * (sums + team_size * lowest))
+        lineups = ((int(differences[i]), mask) for i in np.argsort(differences, kind='stable')
+                   for mask in counted_subsets(counts, relative, len(relative), team_size, int(sums[i])))
+        return islice(lineups, k)
+    if pool_size > tables.MAX_POOL_SIZE:
+        raise ValueError(f'Line-ups can only be listed for pools of up to {tables.MAX_POOL_SIZE} players, unless '
+                         f'their ratings are close enough to count')
+    options = tables.options(pool_size)
+    differences = score(options, ratings)
+    order = differences * len(options) + np.arange(len(options))
+    fairest = np.argpartition(order, k - 1)[:k] if k < len(options) else np.arange(len(options))
+    return ((int(differences[i]), int(options[i])) for i in fairest[np.argsort(order[fairest])])
+
+
+def constrained(ratings, rng, together=(), apart=(), team0=(), team1=()):
+    """Branch and bound over the players of the pool with constraints, given as lists of pool indexes:
+       groups of players kept together, pairs of players kept apart and players fixed to each team.
+       Players kept together are placed as one unit, constrained units first, then the other players
+       from highest to lowest rating. A branch is pruned once the fairest difference it can reach is
+       worse than the fairest line-up found so far, so constraints shrink the search. When the
+       counting table of the unconstrained players fits, each branch is finished from the table
+       instead, which counts and samples its fairest line-ups without visiting them."""
+    pool_size = len(ratings)
+    team_size = pool_size // 2
+    total = sum(ratings)
+    groups = list(range(pool_size))
+
+    def group(i):
+        while groups[i] != i:
+            groups[i] = groups[groups[i]]
+            i = groups[i]
+        return i
+
+    for players in together:
+        for i in players[1:]:
+            groups[group(i)] = group(players[0])
+    units = {}
+    for i in range(pool_size):
+        units.setdefault(group(i), []).append(i)
+    sides = {}
+    for side, players in enumerate((team0, team1)):
+        for i in players:
+            if sides.setdefault(group(i), side) != side:
+                raise ValueError('Constraints cannot be satisfied')
+    if not sides:
+        sides[group(pool_size - 1)] = 0
+    enemies = {}
+    for i, j in apart:
+        if group(i) == group(j):
+            raise ValueError('Constraints cannot be satisfied')
+        enemies.setdefault(group(i), set()).add(group(j))
+        enemies.setdefault(group(j), set()).add(group(i))
+    constraining = sorted((root for root in units if root in sides or root in enemies or len(units[root]) > 1),
+                          key=lambda root: -sum(ratings[i] for i in units[root]))
+    free = sorted((root for root in units if len(units[root]) == 1 and root not in constraining),
+                  key=lambda root: -ratings[root])
+    order = constraining + free
+    masks = [sum(1 << i for i in units[root]) for root in order]
+    sizes = [len(units[root]) for root in order]
+    weights = [sum(ratings[i] for i in units[root]) for root in order]
+    remaining = [sum(weights[position:]) for position in range(len(order) + 1)]
+    suffix = [0]
+    for root in reversed(free):
+        suffix.insert(0, suffix[0] + ratings[root])
+    lowest = min((ratings[root] for root in free), default=0)
+    relative = [ratings[root] - lowest for root in free]
+    counts = None
+    if counting_cells(relative, min(team_size, len(free))) <= MAX_COUNTING_CELLS:
+        counts = counting_table(relative, min(team_size, len(free)))
+    placed = {}
+    best = {'difference': None, 'parsed': 0, 'mask': None}
+
+    def record(difference, parsed, sample):
+        if best['difference'] is None or difference < best['difference']:
+            best.update(difference=difference, parsed=0)
+        best['parsed'] += parsed
+        if rng.randrange(best['parsed']) < parsed:
+            best['mask'] = sample()
+
+    def finish(size1, sum1, mask):
+        needed = team_size - size1
+        sums = np.flatnonzero(counts[-1, needed])
+        differences = np.abs(total - 2 * (sum1 + sums + needed * lowest))
+        difference = int(differences.min())
+        if best['difference'] is not None and difference > best['difference']:
+            return
+        fairest = [(int(counts[-1, needed, option]), int(option)) for option in sums[differences == difference]]
+
+        def sample():
+            index = rng.randrange(sum(count for count, _ in fairest))
+            for count, option in fairest:
+                if index < count:
+                    break
+                index -= count
+            chosen = counted_sample(counts, relative, needed, option, rng)
+            return mask | sum(1 << free[i] for i in range(len(free)) if (chosen >> i) & 1)
+
+        record(difference, sum(count for count, _ in fairest), sample)
+
+    def bound(position, size1, sum1):
+        if position < len(constraining):
+            return max(0, 2 * sum1 - total, total - 2 * (sum1 + remaining[position]))
+        start = position - len(constraining)
+        needed = team_size - size1
+        highest = sum1 + suffix[start] - suffix[start + needed]
+        lowest_sum = sum1 + suffix[len(free) - needed] - suffix[len(free)]
+        return max(0, 2 * lowest_sum - total, total - 2 * highest)
+
+    def search(position, size1, sum1, mask):
+        size0 = sum(sizes[:position]) - size1
+        if size1 > team_size or size0 > pool_size - team_size:
+            return
+        if position >= len(constraining) and team_size - size1 > len(order) - position:
+            return
+        if best['difference'] is not None and bound(position, size1, sum1) > best['difference']:
+            return
+        if position == len(constraining) and counts is not None:
+            return finish(size1, sum1, mask)
+        if position == len(order):
+            return record(abs(total - 2 * sum1), 1, lambda: mask)
+        root = order[position]
+        for side in ([1, 0] if 2 * (sum1 + weights[position]) <= total else [0, 1]):
+            if sides.get(root, side) != side or any(placed.get(enemy) == side for enemy in enemies.get(root, ())):
+                continue
+            placed[root] = side
+            if side:
+                search(position + 1, size1 + sizes[position], sum1 + weights[position], mask | masks[position])
+            else:
+                search(position + 1, size1, sum1, mask)
+            del placed[root]
+
+    search(0, 0, 0, 0)
+    if best['difference'] is None:
+        raise ValueError('Constraints cannot be satisfied')
+    return Solution(total_options(pool_size), best['parsed'], best['difference'], best['mask'])
+
+
+ENGINES = {
+    'brute-force': brute_force,
+    'vectorized': vectorized,
+    'meet-in-the-middle': meet_in_the_middle,
+    'counting': counting,
+    'streaming': streaming,
+    'parallel': parallel,
+}
+
+
+def choose_engine(ratings, time_budget_ms=None):
+    """Returns the name of the engine used by default for the pool of the given ratings. The exact engines
+       are used whatever the time budget, unless it is too short for meet-in-the-middle, whose time is
+       estimated from the subsets of each half of the pool, in which case the parallel engine is used."""
+    if len(ratings) <= CUTOVER:
+        return 'vectorized'
+    relative = [rating - min(ratings[:-1]) for rating in ratings[:-1]]
+    if len(ratings) <= 64 and counting_cells(relative, len(ratings) // 2) <= MAX_COUNTING_CELLS:
+        return 'counting'
+    if time_budget_ms is not None and 2 ** (len(ratings) / 2) * SUBSET_MICROSECONDS / 1000 > time_budget_ms:
+        return 'parallel'
+    return 'meet-in-the-middle'
+
+
+def solve(ratings, engine=None, seed=None, time_budget_ms=None, constraints=None):
+    """Returns the Solution of the named engine, or of the default engine for the pool size. The
+       line-up picked is the same for the same seed. A time budget is only used by the parallel
+       engine, which is only the default when the budget is too short for the exact engines.
+       Constraints are always searched by the constrained engine."""
+    if constraints:
+        return constrained(ratings, Random(seed), **constraints)
+    if engine is None:
+        engine = choose_engine(ratings, time_budget_ms)
+    if engine == 'parallel':
+        return parallel(ratings, Random(seed), time_budget_ms)
+    return ENGINES[engine](ratings, Random(seed))
@@ -0,0 +1,124 @@
+"""Meet-in-the-middle state for the pools of matches, kept between calculate-teams calls.
+
+On match day a pool changes a player at a time, so the subset sums of each half of a pool
+and its fairest line-ups are cached by match. When players join or leave, or their ratings
+change, only the half they are in is updated and the fairest line-ups are paired again.
+"""
+from collections import OrderedDict
+from os import getenv
+
+from engines import Solution, fairest_pairs, index_sums, sample_pair, subset_sums, total_options
+from metrics import phase
+
+
+CACHE_SIZE = int(getenv("SOLVER_CACHE_SIZE", 64))
+MAX_CHANGES = 4
+
+
+def add(sums, rating, bit):
+    """Adds a player with the given rating and mask bit to the subset sums of a half."""
+    for size in sorted(sums, reverse=True):
+        sums.setdefault(size + 1, []).extend((total + rating, mask | bit) for total, mask in sums[size])
+
+
+def remove(sums, position):
+    """Removes the player at the given position of a half from its subset sums, moving the mask
+       bits of the players after them down by one."""
+    bit = 1 << position
+    low = bit - 1
+    kept = {}
+    for size, subsets in sums.items():
+        kept[size] = [(total, mask & low | (mask >> 1) & ~low) for total, mask in subsets if not mask & bit]
+    return {size: subsets for size, subsets in kept.items() if subsets}
+
+
+class PoolState:
+    """The subset sums of the two halves of a pool. One player, the anchor, is always in team0
+       so each split of the pool is only counted once."""
+
+    def __init__(self, ratings):
+        players = list(ratings)
+        self.ratings = dict(ratings)
+        self.anchor = players[-1]
+        half = (len(players) - 1) // 2
+        self.halves = [players[:half], players[half:-1]]
+        self.sums = [subset_sums([self.ratings[player] for player in half]) for half in self.halves]
+        self.index = None
+        self.fairest = None
+
+    def add(self, player, rating):
+        half = 0 if len(self.halves[0]) <= len(self.halves[1]) else 1
+        self.ratings[player] = rating
+        add(self.sums[half], rating, 1 << len(self.halves[half]))
+        self.halves[half].append(player)
+        self.changed(half)
+
+    def remove(self, player):
+        del self.ratings[player]
+        if player == self.anchor:
+            half = 0 if len(self.halves[0]) > len(self.halves[1]) else 1
+            self.anchor = player = self.halves[half][-1]
+        else:
+            half = 0 if player in self.halves[0] else 1
+        position = self.halves[half].index(player)
+        self.sums[half] = remove(self.sums[half], position)
+        del self.halves[half][position]
+        self.changed(half)
+
+    def changed(self, half):
+        if half == 1:
+            self.index = None
+        self.fairest = None
+
+    def solve(self, order, rng):
+        """Returns a Solution with its mask over the players in the given order."""
+        if self.index is None:
+            with phase('incremental', 'enumeration'):
+                self.index = index_sums(self.sums[1])
+        if self.fairest is None:
+            with phase('incremental', 'scoring'):
+                self.fairest = fairest_pairs(self.sums[0], self.index, sum(self.ratings.values()),
+                                             len(self.ratings) // 2)
+        difference, candidates = self.fairest
+        parsed, mask = sample_pair(candidates, rng, len(self.halves[0]))
+        team1 = {player for i, player in enumerate(self.halves[0] + self.halves[1]) if (mask >> i) & 1}
+        return Solution(total_options(len(order)), parsed, difference,
+                        sum(1 << i for i, player in enumerate(order) if player in team1))
+
+
+class SolverCache:
+    """An LRU of the PoolState of each match, holding at most size pools."""
+
+    def __init__(self, size):
+        self.size = size
+        self.states = OrderedDict()
+
+    def solve(self, match_id, ratings, rng):
+        """Returns the Solution for a pool given as a dict of player id to rating in tenths,
+           updating the cached state of the match if only a few players have changed."""
+        state = self.states.pop(match_id, None)
+        if state is not None:
+            removed = [player for player in state.ratings if ratings.get(player) != state.ratings[player]]
+            added = [player for player in ratings if state.ratings.get(player) != ratings[player]]
+            if len(removed) + len(added) > MAX_CHANGES or len(state.ratings) - len(removed) < 2:
+                state = None
+            else:
+                for player in removed:
+                    state.remove(player)
+                for player in added:
+                    state.add(player, ratings[player])
+        if state is None:
+            state = PoolState(ratings)
+        self.states[match_id] = state
+        while len(self.states) > self.size:
+            self.states.popitem(last=False)
+        return state.solve(list(ratings), rng)
+
+    def invalidate(self, players):
+        """Drops the state of every pool holding any of the given players."""
+        players = set(players)
+        for match_id in [match_id for match_id, state in self.states.items() if not players.isdisjoint(state.ratings)]:
+            del self.states[match_id]
+
+
+cache = SolverCache(CACHE_SIZE)
@@ -0,0 +1,184 @@
+"""Calculates the teams of matches in the background.
+
+calculate-teams with background set stores the pool of the match, its ratings and the options
+as a queued job and returns its id, instead of holding a web worker for the whole search. A
+job for the same match, pool, ratings and options as a queued or running job is that job.
+Workers started with ``python jobs.py`` claim queued jobs with SELECT ... FOR UPDATE SKIP
+LOCKED, solve them in a pool of JOB_WORKERS processes and save the teams to the match, unless
+its pool has changed or its winner has been declared since. Jobs left running for longer than
+JOB_TIMEOUT seconds, by a worker that stopped, are queued again.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from hashlib import sha256
+from json import dumps
+from logging import basicConfig, getLogger
+from os import cpu_count, getenv
+from random import Random
+from signal import SIGTERM, signal
+from sys import exit
+from time import perf_counter, sleep
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+import engines
+import metrics
+from engines import choose_engine, solve, vectorized_many
+from incremental import cache as solver_cache
+from models import db, Job, Match
+from multiteam import partition, total_options
+from responses import touch
+
+
+JOB_WORKERS = int(getenv("JOB_WORKERS", cpu_count() or 1))
+JOB_TIMEOUT = int(getenv("JOB_TIMEOUT", 600))
+POLL_INTERVAL = float(getenv("JOB_POLL_INTERVAL", 0.5))
+ACTIVE = ('queued', 'running')
+
+log = getLogger(__name__)
+
+
+def pick_teams(match_id, players, ratings, options):
+    """Returns the fields of the match to save and the response of calculate-teams for a pool of the given player
+       ids and ratings in tenths. Options are the engine, seed, time_budget_ms, constraints, as indexes into the
+       pool, and number of teams of calculate-teams. Raises ValueError if no teams can be picked."""
+    pool_size = len(players)
+    teams = options.get("teams", 2)
+    start = perf_counter()
+    if teams > 2:
+        found = partition(ratings, teams)
+        metrics.solved('multiteam', pool_size, None, perf_counter() - start)
+        return {"team0": [], "team1": [], "teams": [[players[i] for i in team] for team in found.teams]}, {
+            'msg': 'Teams calculated and updated successfully', 'total options': total_options(pool_size, teams),
+            'spread': found.spread / 10, 'exact': found.exact}
+    constraints, time_budget_ms = options.get("constraints"), options.get("time_budget_ms")
+    engine = 'constrained' if constraints else options.get("engine") or choose_engine(ratings, time_budget_ms)
+    if not constraints and engine == 'meet-in-the-middle':
+        engine = 'incremental'
+        solution = solver_cache.solve(match_id, dict(zip(players, ratings)), Random(options.get("seed")))
+    else:
+        solution = solve(ratings, options.get("engine"), options.get("seed"), time_budget_ms, constraints)
+    metrics.solved(engine, pool_size, round(solution.total * solution.coverage), perf_counter() - start)
+    return lineup(players, solution, time_budget_ms is not None)
+
+
+def lineup(players, solution, budgeted=False):
+    """Returns the fields of the match, clearing any split into more teams, and the response of calculate-teams
+       for the Solution of a pool of the given player ids, with its coverage if the search had a time budget."""
+    response = {'msg': 'Teams calculated and updated successfully', 'total options': solution.total,
+                'parsed options': solution.parsed}
+    if budgeted:
+        response.update({'approximate': solution.coverage < 1, 'coverage': solution.coverage})
+    return {"team0": [player for i, player in enumerate(players) if not (solution.mask >> i) & 1],
+            "team1": [player for i, player in enumerate(players) if (solution.mask >> i) & 1], "teams": []}, response
+
+
+def pick_many(pools):
+    """Returns what pick_teams does for each of the given (match_id, players, ratings, seed) pools with the
+       default engine. The pools that engine scores with the vectorized engine are grouped by size and each
+       group is scored at once."""
+    picked = [None] * len(pools)
+    sizes = {}
+    for i, (match_id, players, ratings, seed) in enumerate(pools):
+        if choose_engine(ratings) == 'vectorized':
+            sizes.setdefault(len(ratings), []).append(i)
+        else:
+            picked[i] = pick_teams(match_id, players, ratings, {"seed": seed})
+    for pool_size, group in sizes.items():
+        start = perf_counter()
+        solutions = vectorized_many([pools[i][2] for i in group], [pools[i][3] for i in group])
+        seconds = (perf_counter() - start) / len(group)
+        for i, solution in zip(group, solutions):
+            metrics.solved('vectorized', pool_size, solution.total, seconds)
+            picked[i] = lineup(pools[i][1], solution)
+    return picked
+
+
+def submit(match, players, ratings, options):
+    """Queues a job for the pool of a match, or returns the queued or running job for the same pool."""
+    key = sha256(dumps([match.match_id, players, ratings, options], sort_keys=True).encode()).hexdigest()
+    while True:
+        db.session.execute(insert(Job).values(
+            key=key, team=match.team, match=match.match_id, players=players, ratings=ratings, options=options,
+            status='queued').on_conflict_do_nothing(index_elements=[Job.key], index_where=Job.status.in_(ACTIVE)))
+        job = db.session.execute(select(Job).where((Job.key == key) & Job.status.in_(ACTIVE))).scalar()
+        if job is not None:
+            return job
+
+
+def claim(limit):
+    """Marks up to limit queued jobs as running, queueing again those that have run for over JOB_TIMEOUT
+       seconds, and returns the id, match, players, ratings and options of each."""
+    db.session.execute(update(Job).where((Job.status == 'running') & (
+        Job.started < func.now() - timedelta(seconds=JOB_TIMEOUT))).values(status='queued', started=None))
+    jobs = db.session.execute(select(Job).where(Job.status == 'queued').order_by(Job.job_id).limit(limit)
+                              .with_for_update(skip_locked=True)).scalars().all()
+    claimed = [(job.job_id, job.match, job.players, job.ratings, job.options) for job in jobs]
+    for job in jobs:
+        job.status = 'running'
+        job.started = func.now()
+    db.session.commit()
+    return claimed
+
+
+def finish(job_id, future):
+    """Saves the teams found for a job to its match, or why there are none. Jobs deleted with their match are
+       skipped."""
+    job = db.session.get(Job, job_id, with_for_update=True)
+    if job is None:
+        db.session.rollback()
+        return
+    match = db.session.execute(select(Match).filter_by(match_id=job.match).with_for_update()).scalar()
+    try:
+        fields, response = future.result()
+    except ValueError as error:
+        job.status, job.result = 'failed', {'msg': str(error)}
+    except Exception:
+        log.exception("Job %s failed", job_id)
+        job.status, job.result = 'failed', {'msg': 'Teams could not be calculated'}
+    else:
+        if match is None or match.winner is not None or set(match.pool or []) != set(job.players):
+            job.status, job.result = 'failed', {'msg': 'The pool of the match changed while its teams were calculated'}
+        else:
+            for field, value in fields.items():
+                setattr(match, field, value)
+            touch(match.team)
+            job.status, job.result = 'done', response
+    job.finished = func.now()
+    db.session.commit()
+
+
+def search_inline():
+    """Makes the parallel engine search its shards in the process solving the job, instead of each process
+       starting a pool of its own."""
+    engines.SEARCH_WORKERS = 1
+
+
+def run():
+    """Claims and solves jobs until stopped."""
+    running = {}
+    with ProcessPoolExecutor(JOB_WORKERS, initializer=search_inline) as executor:
+        while True:
+            for job_id, *job in claim(JOB_WORKERS - len(running)) if len(running) < JOB_WORKERS else []:
+                running[executor.submit(pick_teams, *job)] = job_id
+            if not running:
+                sleep(POLL_INTERVAL)
+                continue
+            done, _ = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                try:
+                    finish(job_id, future)
+                except Exception:
+                    log.exception("Job %s could not be finished", job_id)
+                    db.session.rollback()
+
+
+if __name__ == "__main__":
+    from main import app
+    basicConfig(level="INFO")
+    signal(SIGTERM, lambda *args: exit(0))
+    log.info("Solving jobs with %s processes", JOB_WORKERS)
+    with app.app_context():
+        run()
@@ -1,19 +1,29 @@
 from os import getenv
 from hashlib import sha256
-from datetime import timedelta
-from flask import Flask, request, jsonify, make_response
+from datetime import date, timedelta
+from flask import Flask, Response, request, jsonify, make_response
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, set_access_cookies
-from sqlalchemy import select
-from random import choice
-from models import db, Account, Team, Player, Match
+from sqlalchemy import Integer, any_, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from models import db, Account, Team, Player, Match, RatingChange, Job
+from auth import forget, member_required, member_teams
+from engines import ENGINES, tenths, top_k
+from incremental import cache as solver_cache
+from jobs import POLL_INTERVAL, pick_many, pick_teams, submit
+import metrics
+from replay import INCREMENT, drop_snapshots, rebuild
+from responses import conditional, touch
 from decimal import Decimal
+from json import dumps
+from math import isfinite
+from time import perf_counter, sleep
 
 app = Flask(__name__)
 
 
 from dotenv import load_dotenv
 load_dotenv()
-app.config['SQLALCHEMY_ECHO'] = True
+app.config['SQLALCHEMY_ECHO'] = getenv("SQLALCHEMY_ECHO", "").lower() in ("1", "true")
 
 
 app.config["SQLALCHEMY_DATABASE_URI"] = getenv("SQLALCHEMY_DATABASE_URI")
@@ -25,17 +35,68 @@ app.config["JWT_TOKEN_LOCATION"] = ["headers", "cookies", "json", "query_string"
 app.config["JWT_COOKIE_SECURE"] = False
 app.config['JWT_COOKIE_CSRF_PROTECT'] = False
 app.config['JWT_CSRF_CHECK_FORM'] = True
+app.config['MAX_LINEUPS'] = 1000
+app.config['MAX_JOB_WAIT'] = 30
+app.config['MAX_BATCH_ITEMS'] = 100
 
 
 db.init_app(app)
 jwt = JWTManager(app)
-
-
-def binary_options(digits):
-    """Returns a list of ints whose binary representations have an even
-       number of 0's and 1's for the given number of binary digits"""
-    target = digits / 2
-    return [i for i in range(int('1' * (digits - 1), 2)) if i.bit_count() == target]
+metrics.init_app(app, db)
+
+
+def pool_constraints(constraints, players):
+    """Returns constraints of player ids or names as the indexes of the players in the pool."""
+    indexes = {player.player_id: i for i, player in enumerate(players)}
+    indexes.update({player.name: i for i, player in enumerate(players)})
+    if not isinstance(constraints, dict) or not set(constraints).issubset({"together", "apart", "team0", "team1"}):
+        raise ValueError('Constraints may only have the fields together, apart, team0 and team1')
+    groups = {key: constraints.get(key, []) for key in ("together", "apart")}
+    if any(not isinstance(groups[key], list) or any(not isinstance(group, list) for group in groups[key])
+           for key in groups):
+        raise ValueError('Together and apart must be arrays of arrays of players')
+    if any(len(pair) != 2 for pair in groups["apart"]):
+        raise ValueError('Players can only be kept apart in pairs')
+    if any(not isinstance(constraints.get(key, []), list) for key in ("team0", "team1")):
+        raise ValueError('Team0 and team1 must be arrays of players')
+    if any(not isinstance(player, (int, str)) for key in ("team0", "team1") for player in constraints.get(key, [])) or \
+            any(not isinstance(player, (int, str)) for key in groups for group in groups[key] for player in group):
+        raise ValueError('Players must be ids (integers) or names (strings)')
+    if any(player not in indexes for group in groups["together"] + groups["apart"] for player in group) or \
+            any(player not in indexes for key in ("team0", "team1") for player in constraints.get(key, [])):
+        raise ValueError('Constraints must only contain players in the pool')
+    return {"together": [[indexes[player] for player in group] for group in groups["together"]],
+            "apart": [[indexes[player] for player in pair] for pair in groups["apart"]],
+            "team0": [indexes[player] for player in constraints.get("team0", [])],
+            "team1": [indexes[player] for player in constraints.get("team1", [])]}
+
+
+def change_ratings(players, change):
+    """Adds change to the current rating of every given player in one statement."""
+    db.session.execute(update(Player).where(Player.player_id == any_(literal(players, ARRAY(Integer)))).values(
+        current_rating=Player.current_rating + change).execution_options(synchronize_session=False))
+
+
+def record_rating_changes(match_id, winners, losers, change):
+    """Records change for each winner and -change for each loser of a match in the rating ledger."""
+    changes = [{"match": match_id, "player": player, "change": change} for player in winners] + [
+        {"match": match_id, "player": player, "change": -change} for player in losers]
+    if changes:
+        db.session.execute(insert(RatingChange), changes)
+
+
+def reverse_rating_changes(match_id):
+    """Reverses the net rating changes recorded for a match in one statement, and records the reversal. Returns
+       False if there are none, as for winners declared before the rating ledger."""
+    totals = select(RatingChange.match, RatingChange.player, func.sum(RatingChange.change).label("change")).filter_by(
+        match=match_id).group_by(RatingChange.match, RatingChange.player)
+    net = totals.subquery()
+    reversed_players = db.session.execute(update(Player).where(Player.player_id == net.c.player).values(
+        current_rating=Player.current_rating - net.c.change).execution_options(synchronize_session=False)).rowcount
+    net = totals.having(func.sum(RatingChange.change) != 0).subquery()
+    db.session.execute(insert(RatingChange).from_select(["match", "player", "change"], select(
+        net.c.match, net.c.player, -net.c.change)))
+    return reversed_players > 0
 
 
 @app.route("/", methods=["GET"])
@@ -43,6 +104,15 @@ def hello_world():
     return jsonify({'msg': 'hello world'}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Returns the metrics of this worker in the Prometheus text format. Requires the bearer token in METRICS_TOKEN,
+       and is disabled while it is unset."""
+    if not getenv("METRICS_TOKEN") or request.headers.get("Authorization") != f"Bearer {getenv('METRICS_TOKEN')}":
+        return jsonify({'msg': 'Metrics not found'}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/register", methods=["POST"])
 def register():
     """Registers an account. Required fields: name, email, password."""
@@ -85,6 +155,7 @@ def account():
     else:
         db.session.delete(account_from_db)
         db.session.commit()
+        forget(account_id=account_from_db.account_id)
         return jsonify({'msg': 'Account deleted'}), 401
 
 
@@ -113,15 +184,19 @@ def get_team(team_id):
     if get_jwt_identity() not in team_from_db.members:
         return {"team": team_from_db.to_json()}, 200
     if request.method == "GET":
-        players = db.session.execute(select(Player).filter_by(team=team_id)).scalars().all()
-        return jsonify({"team": team_from_db.to_json(),
-                        "players": [player.to_json() for player in players],
-                        "members": [player.to_json() for player in players if player.player_id in team_from_db.members],
-                        "pending": [player.to_json() for player in players if player.player_id in team_from_db.pending]
-                        }), 200
+        def build():
+            players = {player.player_id: player.to_json() for player in db.session.execute(
+                select(Player).filter_by(team=team_id)).scalars()}
+            members, pending = set(team_from_db.members), set(team_from_db.pending)
+            return {"team": team_from_db.to_json(),
+                    "players": list(players.values()),
+                    "members": [player for player_id, player in players.items() if player_id in members],
+                    "pending": [player for player_id, player in players.items() if player_id in pending]}
+        return conditional(f"team-{team_id}", team_from_db.version, build)
     else:
         db.session.delete(team_from_db)
         db.session.commit()
+        forget(team_id)
         return jsonify({'msg': 'Team deleted'}), 200
 
 
@@ -136,24 +211,24 @@ def join_team(team_id):
         return jsonify({'msg': 'Player already in team'}), 200
     team_from_db.pending.append(get_jwt_identity())
     db.session.merge(team_from_db)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Requested to join team successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/process-request", methods=["PATCH", "DELETE"])
 @jwt_required()
+@member_required
 def process_request(team_id):
     """Adds member to team or deletes member request. Required fields: account_id. Optional field: player_id."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
+    team_from_db = db.session.execute(select(Team).filter_by(team_id=team_id)).scalar()
     data = request.get_json()
     if request.method == "PATCH":
         if not data.get("player_id") and data["account_id"] in team_from_db.pending:
             team_from_db.pending.remove(data["account_id"])
             team_from_db.members.append(data["account_id"])
             db.session.merge(team_from_db)
+            touch(team_id)
             db.session.commit()
             return jsonify({'msg': 'Member added successfully'}), 200
         elif data["account_id"] in team_from_db.pending and data["account_id"] in team_from_db.pending:
@@ -163,6 +238,7 @@ def process_request(team_id):
             player_from_db.account = data["account_id"]
             db.session.merge(team_from_db)
             db.session.merge(player_from_db)
+            touch(team_id)
             db.session.commit()
             return jsonify({'msg': 'Member added successfully and associated to player'}), 200
         else:
@@ -170,38 +246,37 @@ def process_request(team_id):
     else:
         team_from_db.pending.remove(data["account_id"])
         db.session.merge(team_from_db)
+        touch(team_id)
         db.session.commit()
         return jsonify({'msg': 'Request rejected'}), 200
 
 
 @app.route("/team/<string:team_id>/delete-member", methods=["PATCH"])
 @jwt_required()
+@member_required
 def delete_member(team_id):
     """Deletes a member from a team and removes their association with a player. Required fields: account_id"""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
+    team_from_db = db.session.execute(select(Team).filter_by(team_id=team_id)).scalar()
     data = request.get_json()
     if data["account_id"] not in team_from_db.members:
         return jsonify({'msg': 'Member not found'}), 404
     team_from_db.members.remove(data["account_id"])
+    forget(team_id, data["account_id"])
     player = db.session.execute(select(Player).filter_by(player_id=data["account_id"])).scalar()
     player.account = None
     db.session.merge(team_from_db)
     db.session.merge(player)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Member deleted successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/merge-member-player", methods=["PATCH"])
 @jwt_required()
+@member_required
 def merge_member_player(team_id):
     """Associates a team member to a team player. Required fields: account_id, player_id."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
+    team_from_db = db.session.execute(select(Team).filter_by(team_id=team_id)).scalar()
     data = request.get_json()
     if data["account_id"] not in team_from_db.members and data["player_id"] not in db.session.execute(
             select(Player.player_id).filter_by(team=team_id)).scalars().all():
@@ -211,18 +286,16 @@ def merge_member_player(team_id):
         return jsonify({'msg': 'Member already associated with player'}), 200
     player.account = data["account_id"]
     db.session.merge(player)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Member associated with player successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/add-player", methods=["POST"])
 @jwt_required()
+@member_required
 def add_player(team_id):
     """Adds a player to a team. Required fields: name, initial_rating, current_rating."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
     data = request.get_json()
     if data.get("account"):
         player_from_db = db.session.execute(select(Player).where(
@@ -233,18 +306,16 @@ def add_player(team_id):
     if player_from_db:
         return jsonify({'msg': 'Player already exists'}), 200
     db.session.add(Player(**data, team=team_id))
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Player added successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/add-match", methods=["POST"])
 @jwt_required()
+@member_required
 def add_match(team_id):
     """Adds match. Required fields: date"""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
     data = request.get_json()
     match_from_db = db.session.execute(select(Match).where(
         (Match.team == team_id) & (Match.date == data["date"]))).scalar()
@@ -252,48 +323,70 @@ def add_match(team_id):
         return jsonify({'msg': 'Match already exists'}), 404
     match = Match(**request.get_json(), team=team_id)
     db.session.add(match)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Match added successfully'}), 200
 
 
+@app.route("/team/<string:team_id>/replay-ratings", methods=["POST"])
+@jwt_required()
+@member_required
+def replay_ratings(team_id):
+    """Recomputes the ratings of the players of a team from the declared winners of its matches. Optional fields:
+       since, the date of the earliest match that changed (e.g. 2023-01-31), to replay from the last snapshot before
+       it; dry_run, which reports the changes without saving them."""
+    data = request.get_json(silent=True) or {}
+    try:
+        since = date.fromisoformat(data["since"]) if data.get("since") else None
+    except (TypeError, ValueError):
+        return jsonify({'msg': 'Since must be a date such as 2023-01-31'}), 404
+    summary = rebuild([int(team_id)], since, bool(data.get("dry_run")))
+    if data.get("dry_run"):
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return jsonify({'msg': 'Ratings replayed successfully', 'matches': summary.matches, 'changed': summary.changed,
+                    'snapshots': summary.snapshots}), 200
+
+
 @app.route("/team/<string:team_id>/<string:match_id>", methods=["GET", "DELETE"])
 @jwt_required()
+@member_required
 def get_match(team_id, match_id):
     """Returns or deletes a match."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
-    match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id)).scalar()
+    match_from_db, version = db.session.execute(select(Match, Team.version).join(Team).where(
+        (Match.match_id == match_id) & (Match.team == team_id))).first() or (None, None)
+    if not match_from_db:
+        return jsonify({'msg': 'Match not found'}), 404
     if request.method == "GET":
-        if not match_from_db:
-            return jsonify({'msg': 'Match not found'}), 404
-        players = db.session.execute(select(Player).filter_by(team=team_id)).scalars().all()
-        return jsonify({"match": match_from_db.to_json(),
-                        "players": [player.to_json() for player in players],
-                        "team0": [player.to_json() for player in players if player.player_id in match_from_db.team0],
-                        "team1": [player.to_json() for player in players if player.player_id in match_from_db.team1],
-                        "pool": [player.to_json() for player in players if player.player_id in match_from_db.pool]
-                        }), 200
+        def build():
+            players = {player.player_id: player.to_json() for player in db.session.execute(
+                select(Player).filter_by(team=team_id)).scalars()}
+
+            def side(player_ids):
+                player_ids = set(player_ids or [])
+                return [player for player_id, player in players.items() if player_id in player_ids]
+            return {"match": match_from_db.to_json(),
+                    "players": list(players.values()),
+                    "team0": side(match_from_db.team0),
+                    "team1": side(match_from_db.team1),
+                    "pool": side(match_from_db.pool),
+                    "teams": [side(team) for team in match_from_db.teams or []]}
+        return conditional(f"match-{team_id}-{match_id}", version, build)
     else:
-        if not match_from_db:
-            return jsonify({'msg': 'Match not found'}), 404
         if match_from_db.winner is not None:
             return jsonify({'msg': 'Match cannot be removed if the match winner has been declared'}), 404
-        match = Match(**request.get_json(), team=team_from_db.team_id)
-        db.session.delete(match)
+        db.session.delete(match_from_db)
+        touch(team_id)
         db.session.commit()
         return jsonify({'msg': 'Match deleted successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/<string:match_id>/update-teams", methods=["PATCH"])
 @jwt_required()
+@member_required
 def update_teams(team_id, match_id):
     """Updates the teams of a match. Required fields: team0, team1. Both are an array of player_ids."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
     match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id)).scalar()
     if not match_from_db:
         return jsonify({'msg': 'Match not found'}), 404
@@ -316,19 +409,18 @@ def update_teams(team_id, match_id):
         return jsonify({'msg': 'Team0 and Team1 must be disjoint'}), 404
     match_from_db.team0 = list(team0)
     match_from_db.team1 = list(team1)
+    match_from_db.teams = []
     db.session.merge(match_from_db)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Teams added successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/<string:match_id>/update-pool", methods=["PATCH"])
 @jwt_required()
+@member_required
 def update_pool(team_id, match_id):
     """Updates the pool of a match. Required fields: pool. Pool is an array of player_ids."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
     match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id)).scalar()
     if not match_from_db:
         return jsonify({'msg': 'Match not found'}), 404
@@ -345,79 +437,210 @@ def update_pool(team_id, match_id):
         return jsonify({'msg': "Pool must be a subset of a team's players"}), 404
     match_from_db.pool = data["pool"]
     db.session.merge(match_from_db)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Pool added successfully'}), 200
 
 
 @app.route("/team/<string:team_id>/<string:match_id>/calculate-teams", methods=["PATCH"])
 @jwt_required()
+@member_required
 def calculate_teams(team_id, match_id):
-    """Calculates the fairest combination of teams."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
+    """Calculates the fairest combination of teams. Optional fields: engine, one of brute-force, vectorized,
+       meet-in-the-middle, counting, streaming or parallel (chosen by pool size if not given); seed, which makes the
+       line-up picked repeatable; time_budget_ms, after which the parallel engine returns the fairest line-up
+       found so far (only used by default when the budget is too short for the exact engines); constraints, with
+       optional arrays of players (ids or names) to keep together, pairs of players to keep apart and players fixed
+       to team0 or team1, e.g. {"together": [[1, 2]], "apart": [[3, 4]], "team0": [5], "team1": []}, which are
+       searched by the constrained engine; teams, the number of teams to split the pool into (2 if not given), saved
+       in the teams field of the match in place of team0 and team1 when more than 2; background, which queues the
+       calculation as a job and returns 202 with the job, to be polled at its Location."""
     match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id)).scalar()
     if not match_from_db:
         return jsonify({'msg': 'Match not found'}), 404
     if match_from_db.winner is not None:
         return jsonify({'msg': 'Teams cannot be calculated if the match winner has been declared'}), 404
-    players = db.session.execute(select(Player).where(Player.player_id.in_(match_from_db.pool))).scalars().all()
+    data = request.get_json(silent=True) or {}
+    if data.get("engine") is not None and data["engine"] not in ENGINES:
+        return jsonify({'msg': f'Engine must be one of {", ".join(ENGINES)}'}), 404
+    time_budget_ms = data.get("time_budget_ms")
+    if time_budget_ms is not None and (not isinstance(time_budget_ms, (int, float)) or time_budget_ms <= 0):
+        return jsonify({'msg': 'Time budget must be a positive number of milliseconds'}), 404
+    if data.get("seed") is not None and not isinstance(data["seed"], (int, str)):
+        return jsonify({'msg': 'Seed must be an integer or a string'}), 404
+    teams = data.get("teams", 2)
+    if not isinstance(teams, int) or teams < 2:
+        return jsonify({'msg': 'Teams must be a number of at least 2'}), 404
+    if data.get("constraints") and teams > 2:
+        return jsonify({'msg': 'Constraints can only be used with 2 teams'}), 404
+    players = db.session.execute(select(Player).where(
+        Player.player_id.in_(match_from_db.pool)).order_by(Player.player_id)).scalars().all()
     pool_size = len(players)
-    if pool_size % 2 != 0:
+    if teams > 2 and (pool_size == 0 or pool_size % teams != 0):
+        return jsonify({'msg': 'Pool must split into teams of an equal number'}), 404
+    if teams == 2 and (pool_size == 0 or pool_size % 2 != 0):
         return jsonify({'msg': 'Pool must be an equal number'}), 404
-    options = binary_options(pool_size)
-
-    pool_ratings = [float(player.current_rating) for player in players]
-
-    team_ratings = []
+    ratings = [tenths(player.current_rating) for player in players]
+    try:
+        constraints = pool_constraints(data["constraints"], players) if data.get("constraints") else None
+        options = {"engine": data.get("engine"), "seed": data.get("seed"), "time_budget_ms": time_budget_ms,
+                   "constraints": constraints, "teams": teams}
+        if data.get("background"):
+            job = submit(match_from_db, [player.player_id for player in players], ratings, options)
+            db.session.commit()
+            return jsonify({'msg': 'Teams calculation queued', 'job': job.to_json()}), 202, {
+                'Location': f'/team/{team_id}/jobs/{job.job_id}'}
+        fields, response = pick_teams(match_from_db.match_id, [player.player_id for player in players], ratings,
+                                      options)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 404
+    for field, value in fields.items():
+        setattr(match_from_db, field, value)
+    db.session.merge(match_from_db)
+    touch(team_id)
+    db.session.commit()
+    return jsonify(response), 200
 
-    for integer in options:
-        option0 = 0
-        option1 = 0
-        for i in range(pool_size - 1, -1, -1):
-            bit = (integer >> i) & 1
-            if bit == 0:
-                option0 += pool_ratings[i]
-            else:
-                option1 += pool_ratings[i]
-        team_ratings.append(round(abs(option0 - option1), 1))
 
-    min_team_rating = min(team_ratings)
-    parsed = [options[i] for i in range(len(options)) if team_ratings[i] == min_team_rating]
-    teams = [(choice(parsed) >> bit) & 1 for bit in range(pool_size - 1, -1, -1)]
+@app.route("/team/<string:team_id>/jobs/<string:job_id>", methods=["GET"])
+@jwt_required()
+@member_required
+def get_job(team_id, job_id):
+    """Returns a calculate-teams job, with the response of calculate-teams once it has finished. Optional query
+       parameter: wait, the number of seconds (up to MAX_JOB_WAIT) to wait for the job to finish."""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        wait = None
+    if wait is None or not isfinite(wait):
+        return jsonify({'msg': 'Wait must be a number of seconds'}), 404
+    deadline = perf_counter() + min(max(wait, 0), app.config['MAX_JOB_WAIT'])
+    while True:
+        job = db.session.execute(select(Job).where((Job.job_id == job_id) & (Job.team == team_id)).execution_options(
+            populate_existing=True)).scalar()
+        if not job:
+            return jsonify({'msg': 'Job not found'}), 404
+        if job.status not in ('queued', 'running') or perf_counter() >= deadline:
+            break
+        db.session.rollback()
+        sleep(POLL_INTERVAL)
+    return jsonify({'job': job.to_json()}), 200 if job.status in ('done', 'failed') else 202
+
+
+@app.route("/batch/calculate-teams", methods=["POST"])
+@jwt_required()
+def batch_calculate_teams():
+    """Sets the pool of many matches and calculates their teams in one transaction, with the default engine.
+       Required fields: items, an array of up to MAX_BATCH_ITEMS objects with a team_id, a match_id and a pool of
+       player ids or names, and optionally a seed. Returns the status and response of each item in order."""
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'msg': 'Items must be a non-empty array of objects'}), 404
+    if len(items) > app.config['MAX_BATCH_ITEMS']:
+        return jsonify({'msg': f'Items must be at most {app.config["MAX_BATCH_ITEMS"]}'}), 404
+    if not all(isinstance(item.get(key), int) for item in items for key in ("team_id", "match_id")):
+        return jsonify({'msg': 'Every item must have an integer team_id and match_id'}), 404
+    teams = member_teams(get_jwt_identity(), {item["team_id"] for item in items})
+    matches = {match.match_id: match for match in db.session.execute(select(Match).where(
+        Match.match_id.in_({item["match_id"] for item in items}) & Match.team.in_(teams))).scalars()}
+    players = {}
+    for player in db.session.execute(select(Player).where(Player.team.in_(teams))).scalars():
+        players.setdefault(player.team, {}).update({player.player_id: player, player.name: player})
+    results, pools, seen = [None] * len(items), [], set()
+    for i, item in enumerate(items):
+        match = matches.get(item["match_id"])
+        pool = item.get("pool")
+        if item["team_id"] not in teams:
+            result = {'msg': 'Team not found (does it exist and are you a member?)'}
+        elif match is None or match.team != item["team_id"]:
+            result = {'msg': 'Match not found'}
+        elif match.match_id in seen:
+            result = {'msg': 'Match is already in the batch'}
+        elif match.winner is not None:
+            result = {'msg': 'Teams cannot be calculated if the match winner has been declared'}
+        elif item.get("seed") is not None and not isinstance(item["seed"], (int, str)):
+            result = {'msg': 'Seed must be an integer or a string'}
+        elif not isinstance(pool, list) or not (all(isinstance(player, int) for player in pool) or
+                                                all(isinstance(player, str) for player in pool)):
+            result = {'msg': "Pool must be provided as an array of ids (integers) or names (strings)"}
+        elif any(player not in players.get(match.team, {}) for player in pool):
+            result = {'msg': "Pool must be a subset of a team's players"}
+        else:
+            pool = sorted({players[match.team][player] for player in pool}, key=lambda player: player.player_id)
+            result = None if pool and len(pool) % 2 == 0 else {'msg': 'Pool must be an equal number'}
+        if result is not None:
+            results[i] = {'team_id': item["team_id"], 'match_id': item["match_id"], 'status': 404, **result}
+            continue
+        seen.add(match.match_id)
+        match.pool = [player.player_id for player in pool]
+        pools.append((i, match, (match.match_id, match.pool, [tenths(player.current_rating) for player in pool],
+                                 item.get("seed"))))
+    for (i, match, _), (fields, response) in zip(pools, pick_many([pool for _, _, pool in pools])):
+        for field, value in fields.items():
+            setattr(match, field, value)
+        results[i] = {'team_id': match.team, 'match_id': match.match_id, 'status': 200, **response}
+    if pools:
+        touch(*{match.team for _, match, _ in pools})
+    db.session.commit()
+    return jsonify({'msg': f'{len(pools)} of {len(items)} matches calculated', 'results': results}), 200
 
-    match_from_db.team0 = [players[i].player_id for i, bit in enumerate(teams) if bit == 0]
-    match_from_db.team1 = [players[i].player_id for i, bit in enumerate(teams) if bit == 1]
 
-    db.session.merge(match_from_db)
-    db.session.commit()
-    return jsonify({'msg': 'Teams calculated and updated successfully', 'total options': len(options),
-                    'parsed options': len(parsed)}), 200
+@app.route("/team/<string:team_id>/<string:match_id>/lineups", methods=["GET"])
+@jwt_required()
+@member_required
+def lineups(team_id, match_id):
+    """Streams the k fairest line-ups of a match's pool as newline-delimited json, fairest first. Optional query
+       parameter: k (defaults to 10)."""
+    match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id, team=team_id)).scalar()
+    if not match_from_db:
+        return jsonify({'msg': 'Match not found'}), 404
+    k = request.args.get("k", 10, type=int)
+    if not 0 < k <= app.config['MAX_LINEUPS']:
+        return jsonify({'msg': f"k must be between 1 and {app.config['MAX_LINEUPS']}"}), 404
+    players = db.session.execute(select(Player).where(
+        Player.player_id.in_(match_from_db.pool) & (Player.team == team_id)).order_by(Player.player_id)).scalars().all()
+    if len(players) == 0 or len(players) % 2 != 0:
+        return jsonify({'msg': 'Pool must be an equal number'}), 404
+    names = [player.name for player in players]
+    ratings = [tenths(player.current_rating) for player in players]
+    try:
+        fairest = top_k(ratings, k)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 404
+
+    def generate():
+        for rank, (difference, mask) in enumerate(fairest, 1):
+            team1 = sum(rating for i, rating in enumerate(ratings) if (mask >> i) & 1)
+            yield dumps({'rank': rank,
+                         'team0': [name for i, name in enumerate(names) if not (mask >> i) & 1],
+                         'team1': [name for i, name in enumerate(names) if (mask >> i) & 1],
+                         'team0 rating': (sum(ratings) - team1) / 10,
+                         'team1 rating': team1 / 10,
+                         'difference': difference / 10}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
 
 
 @app.route("/team/<string:team_id>/<string:match_id>/declare-winner", methods=["PATCH", "DELETE"])
 @jwt_required()
+@member_required
 def declare_winner(team_id, match_id):
-    """Declares a winner and increments the ratings of players in each team."""
-    team_from_db = db.session.execute(select(Team).where(
-        Team.members.contains([get_jwt_identity()]) & (Team.team_id == team_id))).scalar()
-    if not team_from_db:
-        return jsonify({'msg': 'Team not found (does it exist and are you a member?)'}), 404
-    match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id)).scalar()
+    """Declares a winner and increments the ratings of players in each team. Each change is recorded in the rating
+       ledger, which is reversed when the winner is removed."""
+    match_from_db = db.session.execute(select(Match).filter_by(match_id=match_id).with_for_update()).scalar()
     if not match_from_db:
         return jsonify({'msg': 'Match not found'}), 404
     if request.method == "PATCH":
         if match_from_db.winner is not None:
             return jsonify({'msg': 'Match winner already declared'}), 404
+        if match_from_db.teams:
+            return jsonify({'msg': 'A winner cannot be declared for a match split into more than two teams'}), 404
         winner = request.get_json()["winner"]
-        increment = Decimal('0.1')
         match_from_db.winner = winner
     else:
         winner = match_from_db.winner
         if match_from_db.winner is None:
             return jsonify({'msg': 'Match winner not declared'}), 404
-        increment = Decimal('-0.1')
         match_from_db.winner = None
     if winner == 0:
         winners = match_from_db.team0
@@ -426,14 +649,22 @@ def declare_winner(team_id, match_id):
         winners = match_from_db.team1
         losers = match_from_db.team0
     elif winner == -1:
+        touch(team_id)
         db.session.commit()
         return jsonify({'msg': 'Draw added, no player ratings are changed'}), 200
     else:
         return jsonify({'msg': 'A match winner must be a 0 or 1'}), 404
-    for player in db.session.execute(select(Player).where(Player.player_id.in_(winners))).scalars().all():
-        player.current_rating += increment
-    for player in db.session.execute(select(Player).where(Player.player_id.in_(losers))).scalars().all():
-        player.current_rating -= increment
+    solver_cache.invalidate(winners + losers)
+    drop_snapshots(match_from_db.team, match_from_db.date)
+    increment = Decimal(INCREMENT).scaleb(-1)
+    if request.method == "PATCH":
+        change_ratings(winners, increment)
+        change_ratings(losers, -increment)
+        record_rating_changes(match_from_db.match_id, winners, losers, increment)
+    elif not reverse_rating_changes(match_from_db.match_id):
+        record_rating_changes(match_from_db.match_id, winners, losers, increment)
+        reverse_rating_changes(match_from_db.match_id)
+    touch(team_id)
     db.session.commit()
     return jsonify({'msg': 'Winner added and player ratings updated'}), 200
 
@@ -0,0 +1,164 @@
+"""Counters and histograms of requests, SQL statements and team picking, served in the
+Prometheus text format.
+
+Each worker keeps its own metrics, so every worker is scraped on its own. Requests are
+labelled by method and route rule, and the SQL statements of a request are counted through
+the cursor events of SQLAlchemy. When PROFILE_SAMPLE_RATE is set, that fraction of requests
+is run under cProfile, and the profiles of those slower than PROFILE_SLOW_MS milliseconds are
+written to PROFILE_DIR for ``python -m pstats``.
+"""
+from contextlib import contextmanager
+from cProfile import Profile
+from os import getenv, makedirs
+from os.path import join
+from random import random
+from re import sub
+from threading import Lock
+from time import perf_counter, strftime
+from uuid import uuid4
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+
+PROFILE_SAMPLE_RATE = float(getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(getenv("PROFILE_SLOW_MS", 500))
+PROFILE_DIR = getenv("PROFILE_DIR", "profiles")
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+POOL_SIZES = (2, 4, 8, 12, 16, 20, 24, 28, 32, 40, 64)
+
+
+class Metric:
+    """A counter, or a histogram if given buckets, of values by label values."""
+
+    def __init__(self, name, help, labels=(), buckets=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self):
+        kind = "counter" if self.buckets is None else "histogram"
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind}"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            pairs = [f'{name}="{label}"' for name, label in zip(self.labels, labels)]
+            if self.buckets is None:
+                lines.append(f"{self.name}{{{','.join(pairs)}}} {value}")
+                continue
+            for bound, count in zip((*self.buckets, "+Inf"), value):
+                bucket = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket}}} {count}")
+            lines.append(f"{self.name}_count{{{','.join(pairs)}}} {value[-2]}")
+            lines.append(f"{self.name}_sum{{{','.join(pairs)}}} {value[-1]}")
+        return lines
+
+
+requests = Metric("http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+latency = Metric("http_request_duration_seconds", "Request latency.", ("method", "route"), SECONDS)
+statements = Metric("db_statements_per_request", "SQL statements run by a request.", ("method", "route"), COUNTS)
+statement_latency = Metric("db_statement_duration_seconds", "SQL statement latency.", ("statement",), SECONDS)
+pool_sizes = Metric("calculate_teams_pool_size", "Pool sizes of calculate-teams.", ("engine",), POOL_SIZES)
+options = Metric("calculate_teams_options_scanned_total", "Line-ups searched by calculate-teams.", ("engine",))
+solving = Metric("calculate_teams_solve_seconds", "Time calculate-teams spends in its engine.", ("engine",), SECONDS)
+phases = Metric("engine_phase_seconds", "Time engines spend enumerating and scoring line-ups.", ("engine", "phase"),
+                SECONDS)
+METRICS = (requests, latency, statements, statement_latency, pool_sizes, options, solving, phases)
+
+
+@contextmanager
+def phase(engine, name):
+    """Times the block as the named phase of an engine, such as enumeration or scoring."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        phases.observe(perf_counter() - start, engine, name)
+
+
+def solved(engine, pool_size, scanned, seconds):
+    """Records a pool solved by calculate-teams, with the number of line-ups its engine searched if known."""
+    pool_sizes.observe(pool_size, engine)
+    if scanned is not None:
+        options.inc(engine, amount=scanned)
+    solving.observe(seconds, engine)
+
+
+def route():
+    return (request.method, request.url_rule.rule if request.url_rule else "unmatched")
+
+
+def before_request():
+    g.started = perf_counter()
+    g.statements = 0
+    if PROFILE_SAMPLE_RATE and random() < PROFILE_SAMPLE_RATE:
+        g.profile = Profile()
+        g.profile.enable()
+
+
+def after_request(response):
+    elapsed = perf_counter() - g.started
+    method, rule = route()
+    requests.inc(method, rule, str(response.status_code))
+    latency.observe(elapsed, method, rule)
+    statements.observe(g.statements, method, rule)
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            makedirs(PROFILE_DIR, exist_ok=True)
+            name = f"{method}-{sub(r'[^a-z0-9-]+', '_', rule)}-{elapsed * 1000:.0f}ms"
+            profile.dump_stats(join(PROFILE_DIR, f"{strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:6]}-{name}.prof"))
+    return response
+
+
+def teardown_request(error):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("started", []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    kind = statement.split(None, 1)[0].upper() if statement.strip() else "EMPTY"
+    statement_latency.observe(perf_counter() - conn.info["started"].pop(), kind)
+    if has_app_context() and "statements" in g:
+        g.statements += 1
+
+
+def render():
+    """Returns every metric in the Prometheus text format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def init_app(app, db):
+    """Records the requests of the app and the SQL statements of its database."""
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(db.engine, "after_cursor_execute", after_cursor_execute)
@@ -0,0 +1,66 @@
+-- Brings a database created from the original models up to the current ones. Every statement checks what is
+-- already there, so the script can be run again, or on a database that is partly upgraded, with
+--   psql "$DATABASE_URL" -f migrations/upgrade.sql
+
+BEGIN;
+
+-- Multi-team splits of a match.
+ALTER TABLE match ADD COLUMN IF NOT EXISTS teams INTEGER[][];
+
+-- Membership checks look teams up by member.
+CREATE INDEX IF NOT EXISTS ix_team_members ON team USING gin (members);
+
+-- Rating ledger. Rows outlive their match, so the foreign key is replaced in case an earlier version of this
+-- table deleted them with it.
+CREATE TABLE IF NOT EXISTS rating_change (
+    change_id SERIAL NOT NULL,
+    match INTEGER,
+    player INTEGER NOT NULL,
+    change NUMERIC(3, 1) NOT NULL,
+    created TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+    PRIMARY KEY (change_id),
+    FOREIGN KEY (player) REFERENCES player (player_id)
+);
+ALTER TABLE rating_change DROP CONSTRAINT IF EXISTS rating_change_match_fkey;
+ALTER TABLE rating_change ADD CONSTRAINT rating_change_match_fkey
+    FOREIGN KEY (match) REFERENCES match (match_id) ON DELETE SET NULL;
+CREATE INDEX IF NOT EXISTS ix_rating_change_match ON rating_change (match);
+
+-- Rating replay.
+CREATE INDEX IF NOT EXISTS ix_match_team_date ON match (team, date);
+CREATE TABLE IF NOT EXISTS rating_snapshot (
+    snapshot_id SERIAL NOT NULL,
+    team INTEGER NOT NULL,
+    date DATE NOT NULL,
+    players INTEGER[] NOT NULL,
+    ratings INTEGER[] NOT NULL,
+    PRIMARY KEY (snapshot_id),
+    FOREIGN KEY (team) REFERENCES team (team_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_rating_snapshot_team_date ON rating_snapshot (team, date);
+
+-- ETags of teams and matches.
+ALTER TABLE team ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+-- Background jobs.
+CREATE TABLE IF NOT EXISTS job (
+    job_id SERIAL NOT NULL,
+    key VARCHAR(64) NOT NULL,
+    team INTEGER NOT NULL,
+    match INTEGER NOT NULL,
+    players INTEGER[] NOT NULL,
+    ratings INTEGER[] NOT NULL,
+    options JSONB NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    result JSONB,
+    created TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+    started TIMESTAMP WITHOUT TIME ZONE,
+    finished TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (job_id),
+    FOREIGN KEY (team) REFERENCES team (team_id) ON DELETE CASCADE,
+    FOREIGN KEY (match) REFERENCES match (match_id) ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_job_key ON job (key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS ix_job_queued ON job (job_id) WHERE status = 'queued';
+
+COMMIT;
@@ -1,8 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Date
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Date, DateTime, Index, func, text
+from serializers import serializer
 
 
 db = SQLAlchemy()
@@ -13,18 +13,18 @@ class Account(db.Model):
     email = Column(String(150), nullable=False)
     password = Column(String(255), nullable=False)
 
-    def to_json(self):
-        return jsonable_encoder(self, exclude={'password'})
+    to_json = serializer(exclude={'password'})
 
 
 class Team(db.Model):
+    __table_args__ = (Index('ix_team_members', 'members', postgresql_using='gin'),)
     team_id = Column(Integer, primary_key=True)
     name = Column(String(150), nullable=False)
     members = Column(MutableList.as_mutable(ARRAY(Integer)))
     pending = Column(MutableList.as_mutable(ARRAY(Integer)), default=[])
+    version = Column(Integer, nullable=False, default=0, server_default='0')
 
-    def to_json(self):
-        return jsonable_encoder(self, exclude={'members', 'pending'}, exclude_none=True)
+    to_json = serializer(exclude={'members', 'pending', 'version'}, exclude_none=True)
 
 
 class Player(db.Model):
@@ -35,18 +35,54 @@ class Player(db.Model):
     initial_rating = Column(Numeric(3, 1), nullable=False)
     current_rating = Column(Numeric(3, 1), nullable=False)
 
-    def to_json(self):
-        return jsonable_encoder(self, exclude={'team'}, exclude_none=True)
+    to_json = serializer(exclude={'team'}, exclude_none=True)
 
 
 class Match(db.Model):
+    __table_args__ = (Index('ix_match_team_date', 'team', 'date'),)
     match_id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
     team = Column(Integer, ForeignKey('team.team_id'))
     pool = Column(ARRAY(Integer), default=[])
     team0 = Column(ARRAY(Integer), default=[])
     team1 = Column(ARRAY(Integer), default=[])
+    teams = Column(ARRAY(Integer, dimensions=2), default=[])
     winner = Column(Integer)
 
-    def to_json(self):
-        return jsonable_encoder(self, exclude={'match_id', 'team', 'pool', 'team0', 'team1'}, exclude_none=True)
+    to_json = serializer(exclude={'match_id', 'team', 'pool', 'team0', 'team1', 'teams'}, exclude_none=True)
+
+
+class RatingChange(db.Model):
+    change_id = Column(Integer, primary_key=True)
+    match = Column(Integer, ForeignKey('match.match_id', ondelete='SET NULL'), index=True)
+    player = Column(Integer, ForeignKey('player.player_id'), nullable=False)
+    change = Column(Numeric(3, 1), nullable=False)
+    created = Column(DateTime, server_default=func.now())
+
+
+class RatingSnapshot(db.Model):
+    __table_args__ = (Index('ix_rating_snapshot_team_date', 'team', 'date'),)
+    snapshot_id = Column(Integer, primary_key=True)
+    team = Column(Integer, ForeignKey('team.team_id', ondelete='CASCADE'), nullable=False)
+    date = Column(Date, nullable=False)
+    players = Column(ARRAY(Integer), nullable=False)
+    ratings = Column(ARRAY(Integer), nullable=False)
+
+
+class Job(db.Model):
+    __table_args__ = (Index('ix_job_key', 'key', unique=True, postgresql_where=text("status IN ('queued', 'running')")),
+                      Index('ix_job_queued', 'job_id', postgresql_where=text("status = 'queued'")))
+    job_id = Column(Integer, primary_key=True)
+    key = Column(String(64), nullable=False)
+    team = Column(Integer, ForeignKey('team.team_id', ondelete='CASCADE'), nullable=False)
+    match = Column(Integer, ForeignKey('match.match_id', ondelete='CASCADE'), nullable=False)
+    players = Column(ARRAY(Integer), nullable=False)
+    ratings = Column(ARRAY(Integer), nullable=False)
+    options = Column(JSONB, nullable=False)
+    status = Column(String(10), nullable=False, default='queued')
+    result = Column(JSONB)
+    created = Column(DateTime, server_default=func.now())
+    started = Column(DateTime)
+    finished = Column(DateTime)
+
+    to_json = serializer(exclude={'key', 'team', 'players', 'ratings', 'options'}, exclude_none=True)
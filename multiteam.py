@@ -0,0 +1,143 @@
+"""Splits a pool into more than two teams of equal size, minimising the spread between the
+highest and lowest team ratings. Ratings are given in tenths as ints, and teams are returned
+as lists of indexes into the pool.
+"""
+from collections import namedtuple
+from heapq import heapify, heappop, heappush
+from itertools import count
+from math import factorial
+
+
+Partition = namedtuple('Partition', ['teams', 'spread', 'exact'])
+Partition.__doc__ = """The teams found, the spread of their ratings in tenths and whether the spread is
+                       known to be the lowest possible."""
+
+EXACT_POOL_SIZE = 20
+EXACT_NODES = 50000
+
+
+def total_options(pool_size, teams):
+    """Returns the number of ways to split a pool into the given number of equal teams."""
+    return factorial(pool_size) // (factorial(pool_size // teams) ** teams * factorial(teams))
+
+
+def spread(ratings, teams):
+    """Returns the difference between the highest and lowest team ratings."""
+    sums = [sum(ratings[i] for i in team) for team in teams]
+    return max(sums) - min(sums)
+
+
+def largest_differencing(ratings, teams):
+    """The balanced Karmarkar-Karp heuristic. The players, from highest to lowest rating, are cut into
+       rows of one player per team, each a partial split of the pool. The two partial splits with the
+       largest spreads are repeatedly merged, joining the highest team of one to the lowest of the
+       other, so every team keeps one player from each row."""
+    order = sorted(range(len(ratings)), key=lambda i: -ratings[i])
+    tiebreak = count()
+    partials = []
+    for row in range(0, len(order), teams):
+        subsets = [(ratings[i], [i]) for i in order[row:row + teams]]
+        partials.append((-(subsets[0][0] - subsets[-1][0]), next(tiebreak), subsets))
+    heapify(partials)
+    while len(partials) > 1:
+        _, _, first = heappop(partials)
+        _, _, second = heappop(partials)
+        merged = sorted(((a[0] + b[0], a[1] + b[1]) for a, b in zip(first, reversed(second))),
+                        key=lambda subset: -subset[0])
+        heappush(partials, (-(merged[0][0] - merged[-1][0]), next(tiebreak), merged))
+    return [players for _, players in partials[0][2]]
+
+
+def improve(ratings, teams):
+    """Swaps pairs of players between teams while any swap lowers the spread."""
+    teams = [list(team) for team in teams]
+    sums = [sum(ratings[i] for i in team) for team in teams]
+    while True:
+        current = max(sums) - min(sums)
+        best = None
+        for t in range(len(teams)):
+            for u in range(t + 1, len(teams)):
+                for a, i in enumerate(teams[t]):
+                    for b, j in enumerate(teams[u]):
+                        change = ratings[j] - ratings[i]
+                        if not change:
+                            continue
+                        sums[t] += change
+                        sums[u] -= change
+                        option = max(sums) - min(sums)
+                        sums[t] -= change
+                        sums[u] += change
+                        if option < current and (best is None or option < best[0]):
+                            best = (option, t, u, a, b)
+        if best is None:
+            return teams
+        _, t, u, a, b = best
+        change = ratings[teams[u][b]] - ratings[teams[t][a]]
+        teams[t][a], teams[u][b] = teams[u][b], teams[t][a]
+        sums[t] += change
+        sums[u] -= change
+
+
+def exact(ratings, teams, incumbent):
+    """Branch and bound over the players from highest to lowest rating, placing each in every team
+       that is not full. Teams that are still interchangeable are only tried once, and a branch is
+       pruned once its teams cannot reach a lower spread than the incumbent. Returns the best teams
+       found, or None if none beat the incumbent, and whether the search finished within EXACT_NODES."""
+    order = sorted(range(len(ratings)), key=lambda i: -ratings[i])
+    size = len(ratings) // teams
+    suffix = [0]
+    for i in reversed(order):
+        suffix.insert(0, suffix[0] + ratings[i])
+    members = [[] for _ in range(teams)]
+    sums = [0] * teams
+    state = {'best': incumbent, 'teams': None, 'nodes': 0}
+
+    def bound(position):
+        highest = lowest = None
+        for t in range(teams):
+            needed = size - len(members[t])
+            smallest = sums[t] + suffix[len(order) - needed] - suffix[len(order)]
+            largest = sums[t] + suffix[position] - suffix[position + needed]
+            highest = smallest if highest is None else max(highest, smallest)
+            lowest = largest if lowest is None else min(lowest, largest)
+        return max(0, highest - lowest)
+
+    def search(position):
+        state['nodes'] += 1
+        if state['nodes'] > EXACT_NODES:
+            return
+        if position == len(order):
+            state['best'] = max(sums) - min(sums)
+            state['teams'] = [list(team) for team in members]
+            return
+        if bound(position) >= state['best']:
+            return
+        player = order[position]
+        tried = set()
+        for t in sorted(range(teams), key=lambda t: sums[t]):
+            if len(members[t]) == size or (sums[t], len(members[t])) in tried:
+                continue
+            tried.add((sums[t], len(members[t])))
+            members[t].append(player)
+            sums[t] += ratings[player]
+            search(position + 1)
+            members[t].pop()
+            sums[t] -= ratings[player]
+
+    search(0)
+    return state['teams'], state['nodes'] <= EXACT_NODES
+
+
+def partition(ratings, teams):
+    """Splits the pool into the given number of equal teams with the Karmarkar-Karp heuristic and
+       swaps between teams, then, for pools of up to EXACT_POOL_SIZE, searches for a lower spread
+       with branch and bound."""
+    if teams < 2 or len(ratings) % teams:
+        raise ValueError('Pool must split into teams of an equal number')
+    found = improve(ratings, largest_differencing(ratings, teams))
+    lowest = 0 if sum(ratings) % teams == 0 else 1
+    if len(ratings) > EXACT_POOL_SIZE or spread(ratings, found) == lowest:
+        return Partition(found, spread(ratings, found), spread(ratings, found) == lowest)
+    better, finished = exact(ratings, teams, spread(ratings, found))
+    found = better or found
+    return Partition(found, spread(ratings, found), finished)
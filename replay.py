@@ -0,0 +1,154 @@
+"""Recomputes the current ratings of players by replaying the declared winners of their matches.
+
+The matches of each team are loaded in date order and flattened into arrays of players and
+rating changes in tenths, which numpy sums onto the initial ratings. After every
+SNAPSHOT_INTERVAL matches of a team its ratings are saved, so a correction only replays the
+matches after the last snapshot before it. Declaring or removing a winner drops the snapshots
+from the date of its match on.
+
+Run from the root of the repository with ``python replay.py``.
+"""
+from argparse import ArgumentParser
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from os import getenv
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select, update
+
+from engines import tenths
+from incremental import cache as solver_cache
+from models import db, Match, Player, RatingChange, RatingSnapshot
+from responses import touch
+
+
+INCREMENT = int(getenv("RATING_INCREMENT", 1))
+SNAPSHOT_INTERVAL = int(getenv("SNAPSHOT_INTERVAL", 26))
+
+Summary = namedtuple('Summary', ['teams', 'matches', 'changed', 'snapshots'])
+Summary.__doc__ = """The number of teams and matches replayed, of ratings changed and of snapshots saved."""
+
+
+def rating(value):
+    """Returns a rating in tenths as a Decimal such as Decimal('4.9')."""
+    return Decimal(int(value)).scaleb(-1)
+
+
+def positions(index, players):
+    """Returns the positions of the given player ids in the sorted array index, and which of them were found."""
+    players = np.asarray(players, dtype=np.int64)
+    found = np.searchsorted(index, players)
+    known = found < len(index)
+    known[known] = index[found[known]] == players[known]
+    return found, known
+
+
+def changes(matches, index):
+    """Returns the players, as positions in index, the rating changes in tenths and the match of each change for
+       matches given as (winners, losers, number of winners, number of losers), with the player ids of each side
+       as a comma-separated string, as flat arrays."""
+    sides = [side for match in matches for side in match[:2] if side]
+    players = np.fromstring(",".join(sides), dtype=np.int64, sep=",") if sides else np.zeros(0, dtype=np.int64)
+    counts = np.array([match[2:] for match in matches], dtype=np.int64).reshape(-1, 2)
+    deltas = np.repeat(np.tile(np.array([INCREMENT, -INCREMENT], dtype=np.int64), len(matches)), counts.ravel())
+    owners = np.repeat(np.arange(len(matches)), counts.sum(axis=1))
+    found, known = positions(index, players)
+    return found[known], deltas[known], owners[known]
+
+
+def rebuild(team_ids=None, since=None, dry_run=False):
+    """Replays the matches of the given teams, or of every team, and updates the players whose ratings differ,
+       recording each correction in the rating ledger. With since, the date of the earliest match that changed,
+       each team starts from its last snapshot before that date instead of the initial ratings. The caller
+       commits, or rolls back a dry run. Returns a Summary."""
+    query = select(Player.player_id, Player.team, Player.initial_rating, Player.current_rating)
+    if team_ids is not None:
+        query = query.where(Player.team.in_(team_ids))
+    if not dry_run:
+        query = query.with_for_update()
+    players = db.session.execute(query.order_by(Player.player_id)).all()
+    index = np.array([player.player_id for player in players], dtype=np.int64)
+    ratings = np.array([tenths(player.initial_rating) for player in players], dtype=np.int64)
+    current = np.array([tenths(player.current_rating) for player in players], dtype=np.int64)
+    members = {}
+    for position, player in enumerate(players):
+        members.setdefault(player.team, []).append(position)
+
+    winners = case((Match.winner == 0, Match.team0), else_=Match.team1)
+    losers = case((Match.winner == 0, Match.team1), else_=Match.team0)
+    query = select(Match.team, Match.date, func.array_to_string(winners, ","), func.array_to_string(losers, ","),
+                   func.coalesce(func.cardinality(winners), 0), func.coalesce(func.cardinality(losers), 0)).where(
+        Match.winner.in_([0, 1]))
+    if team_ids is not None:
+        query = query.where(Match.team.in_(team_ids))
+    if since is not None:
+        latest = select(RatingSnapshot.team, func.max(RatingSnapshot.date).label("date")).where(
+            RatingSnapshot.date < since).group_by(RatingSnapshot.team)
+        if team_ids is not None:
+            latest = latest.where(RatingSnapshot.team.in_(team_ids))
+        latest = latest.subquery()
+        for snapshot in db.session.execute(select(RatingSnapshot).join(latest, (
+                RatingSnapshot.team == latest.c.team) & (RatingSnapshot.date == latest.c.date))).scalars():
+            found, known = positions(index, snapshot.players)
+            ratings[found[known]] = np.array(snapshot.ratings, dtype=np.int64)[known]
+        query = query.outerjoin(latest, Match.team == latest.c.team).where(
+            latest.c.date.is_(None) | (Match.date > latest.c.date))
+    matches = db.session.execute(query.order_by(Match.team, Match.date, Match.match_id)).all()
+    players, deltas, owners = changes([match[2:] for match in matches], index)
+
+    teams = np.array([match.team for match in matches], dtype=np.int64)
+    firsts = np.flatnonzero(np.r_[True, teams[1:] != teams[:-1]]) if len(teams) else np.zeros(0, dtype=np.int64)
+    replayed = np.arange(len(teams)) - np.repeat(firsts, np.diff(np.r_[firsts, len(teams)])) + 1
+    snapshots, done = [], 0
+    for boundary in np.flatnonzero(replayed % SNAPSHOT_INTERVAL == 0):
+        end = np.searchsorted(owners, boundary, side="right")
+        np.add.at(ratings, players[done:end], deltas[done:end])
+        done = end
+        team = members.get(matches[boundary].team, [])
+        snapshots.append({"team": matches[boundary].team, "date": matches[boundary].date,
+                          "players": index[team].tolist(), "ratings": ratings[team].tolist()})
+    np.add.at(ratings, players[done:], deltas[done:])
+
+    changed = np.flatnonzero(ratings != current)
+    summary = Summary(len(firsts), len(matches), len(changed), len(snapshots))
+    if dry_run:
+        return summary
+    query = delete(RatingSnapshot)
+    if team_ids is not None:
+        query = query.where(RatingSnapshot.team.in_(team_ids))
+    if since is not None:
+        query = query.where(RatingSnapshot.date >= since)
+    db.session.execute(query)
+    if snapshots:
+        db.session.execute(insert(RatingSnapshot), snapshots)
+    if len(changed):
+        db.session.execute(update(Player), [{"player_id": int(index[i]), "current_rating": rating(ratings[i])}
+                                            for i in changed])
+        db.session.execute(insert(RatingChange), [{"match": None, "player": int(index[i]),
+                                                   "change": rating(ratings[i] - current[i])} for i in changed])
+        solver_cache.invalidate(index[changed].tolist())
+        changed = set(changed.tolist())
+        touch(*[team for team, positions in members.items() if not changed.isdisjoint(positions)])
+    return summary
+
+
+def drop_snapshots(team_id, since):
+    """Drops the snapshots of a team from the given date on, as they no longer match its history."""
+    db.session.execute(delete(RatingSnapshot).where((RatingSnapshot.team == team_id) & (RatingSnapshot.date >= since)))
+
+
+if __name__ == "__main__":
+    from main import app
+    parser = ArgumentParser(description="Recomputes player ratings from the declared winners of matches.")
+    parser.add_argument("--teams", type=int, nargs="+", help="the teams to replay (every team if not given)")
+    parser.add_argument("--since", type=date.fromisoformat, help="the date of the earliest match that changed")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without saving them")
+    args = parser.parse_args()
+    with app.app_context():
+        result = rebuild(args.teams, args.since, args.dry_run)
+        if args.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    print(f"Replayed {result.matches} matches of {result.teams} teams: {result.changed} ratings changed, "
+          f"{result.snapshots} snapshots saved")
@@ -0,0 +1,60 @@
+"""Conditional GETs for the most polled team routes.
+
+Every team has a version that the write routes bump in the same transaction as their change.
+The version is part of the ETag of each response built from the team, so a client sending the
+ETag back in If-None-Match gets a 304 without the players being loaded. Bodies are also kept
+by the worker in an LRU of RESPONSE_CACHE_SIZE bodies, shared by every member of the team.
+"""
+from collections import OrderedDict
+from os import getenv
+
+from flask import Response, current_app, request
+from sqlalchemy import update
+
+from models import db, Team
+
+
+RESPONSE_CACHE_SIZE = int(getenv("RESPONSE_CACHE_SIZE", 256))
+
+
+class ResponseCache:
+    """An LRU of json bodies by ETag, holding at most size bodies."""
+
+    def __init__(self, size):
+        self.size = size
+        self.bodies = OrderedDict()
+
+    def get(self, tag):
+        if tag in self.bodies:
+            self.bodies.move_to_end(tag)
+        return self.bodies.get(tag)
+
+    def put(self, tag, body):
+        self.bodies[tag] = body
+        while len(self.bodies) > self.size:
+            self.bodies.popitem(last=False)
+        return body
+
+
+cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+def touch(*team_ids):
+    """Bumps the version of the given teams, so their cached responses and ETags are no longer used."""
+    db.session.execute(update(Team).where(Team.team_id.in_(team_ids)).values(version=Team.version + 1))
+
+
+def conditional(key, version, build):
+    """Returns a 304 if the request has the ETag of the route key at the given team version, or else the json
+       response of build, a function returning a dict, which is cached by ETag."""
+    tag = f"{key}-{version}"
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        body = cache.get(tag)
+        if body is None:
+            body = cache.put(tag, f"{current_app.json.dumps(build())}\n")
+        response = Response(body, mimetype=current_app.json.mimetype)
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
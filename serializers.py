@@ -0,0 +1,43 @@
+"""Turns model instances into dicts for json responses.
+
+The columns of each model are looked up once, on the first call, and the values of loaded
+columns are read straight from the instance, skipping the attribute machinery of SQLAlchemy.
+Decimals become ints when whole and floats otherwise, and dates become ISO strings, as with
+FastAPI's jsonable_encoder, which this replaces.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import inspect
+
+
+def decimal(value):
+    """Returns a Decimal as an int if it has no digits after the point, or as a float."""
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+ENCODERS = {Decimal: decimal, date: date.isoformat, datetime: datetime.isoformat}
+
+
+def serializer(exclude=(), exclude_none=False):
+    """Returns a to_json method giving the columns of an instance as a dict, leaving out the columns in exclude,
+       and those that are None if exclude_none."""
+    columns = {}
+
+    def to_json(self):
+        keys = columns.get(type(self))
+        if keys is None:
+            keys = columns[type(self)] = [column.key for column in inspect(type(self)).column_attrs
+                                          if column.key not in exclude]
+        loaded = self.__dict__
+        encoded = {}
+        for key in keys:
+            value = loaded[key] if key in loaded else getattr(self, key)
+            if value is None:
+                if exclude_none:
+                    continue
+            elif type(value) in ENCODERS:
+                value = ENCODERS[type(value)](value)
+            encoded[key] = value
+        return encoded
+    return to_json
@@ -0,0 +1,97 @@
+"""Tables of every line-up for each even pool size, stored as uint32 arrays.
+
+Tables are built with ``python tables.py`` at deploy time and memory-mapped when used,
+so every worker shares the copy in the page cache. A pool size with no table on disk
+is generated in memory instead. Recently used tables are kept in an LRU limited to
+TABLES_MEMORY_CAP bytes.
+"""
+from argparse import ArgumentParser
+from collections import OrderedDict
+from os import getenv, makedirs, replace
+from os.path import dirname, exists, join
+import numpy as np
+
+
+TABLES_DIR = getenv("TABLES_DIR", join(dirname(__file__), "tables"))
+MEMORY_CAP = int(getenv("TABLES_MEMORY_CAP", 256 * 2 ** 20))
+MAX_POOL_SIZE = 28
+
+
+def generate(pool_size):
+    """Returns a sorted uint32 array of the ints whose lowest pool_size - 1 binary digits have
+       pool_size / 2 1's. Each digit is added in turn, keeping the ints of each count of 1's."""
+    if pool_size > MAX_POOL_SIZE:
+        raise ValueError(f"Tables are only available for pools of up to {MAX_POOL_SIZE} players")
+    digits = pool_size - 1
+    target = pool_size // 2
+    counts = [np.zeros(1, dtype=np.uint32)]
+    for digit in range(digits):
+        bit = np.uint32(1 << digit)
+        lowest = max(target - (digits - digit), 0)
+        counts = [counts[count] if count < len(counts) else None for count in range(min(digit + 1, target) + 1)]
+        for count in range(len(counts) - 1, max(lowest, 1) - 1, -1):
+            with_bit = counts[count - 1] | bit
+            counts[count] = with_bit if counts[count] is None else np.concatenate((counts[count], with_bit))
+        counts[:lowest] = [None] * lowest
+    return counts[target]
+
+
+def path(pool_size, directory=None):
+    """Returns the file of the table for the given pool size."""
+    return join(directory or TABLES_DIR, f"{pool_size}.npy")
+
+
+def build(pool_size, directory=None):
+    """Generates the table for the given pool size and writes it to disk."""
+    directory = directory or TABLES_DIR
+    makedirs(directory, exist_ok=True)
+    partial = path(pool_size, directory) + ".partial"
+    with open(partial, "wb") as file:
+        np.save(file, generate(pool_size))
+    replace(partial, path(pool_size, directory))
+
+
+class TableCache:
+    """An LRU of tables that holds at most capacity bytes."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.tables = OrderedDict()
+
+    def get(self, pool_size):
+        if pool_size in self.tables:
+            self.tables.move_to_end(pool_size)
+            return self.tables[pool_size]
+        if exists(path(pool_size)):
+            table = np.load(path(pool_size), mmap_mode="r")
+        else:
+            table = generate(pool_size)
+        self.tables[pool_size] = table
+        self.size += table.nbytes
+        while self.size > self.capacity and len(self.tables) > 1:
+            _, evicted = self.tables.popitem(last=False)
+            self.size -= evicted.nbytes
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.size = 0
+
+
+cache = TableCache(MEMORY_CAP)
+
+
+def options(pool_size):
+    """Returns the read-only table of line-ups for the given pool size."""
+    return cache.get(pool_size)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Builds the line-up tables for every even pool size.")
+    parser.add_argument("--max-pool-size", type=int, default=int(getenv("TABLES_MAX_POOL_SIZE", 24)))
+    parser.add_argument("--directory", default=TABLES_DIR)
+    args = parser.parse_args()
+    for size in range(2, min(args.max_pool_size, MAX_POOL_SIZE) + 1, 2):
+        build(size, args.directory)
+        print(f"Built table for pools of {size} players")
@@ -0,0 +1,77 @@
+"""Fixtures shared by the tests.
+
+The app is imported against TEST_DATABASE_URI, never the database of the environment. Tests using the database
+fixture drop and create every table of it, so it must be a scratch Postgres database; they are skipped when it is
+not set, and the other tests run against an unused in-memory database.
+"""
+from datetime import date
+from os import environ, getenv
+from time import monotonic
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+environ["SQLALCHEMY_DATABASE_URI"] = getenv("TEST_DATABASE_URI") or "sqlite://"
+environ.setdefault("SECRET_KEY", "test-secret-key-" * 4)
+
+import auth  # noqa: E402
+import incremental  # noqa: E402
+import responses  # noqa: E402
+from main import app as flask_app  # noqa: E402
+from models import db, Account, Team, Player, Match  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    auth.memberships.clear()
+    responses.cache.bodies.clear()
+    incremental.cache.states.clear()
+    with flask_app.app_context():
+        yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(app):
+    """Returns the headers authenticating requests as the given account id."""
+    return lambda account_id: {"Authorization": f"Bearer {create_access_token(identity=account_id)}"}
+
+
+@pytest.fixture
+def member():
+    """Makes the given account id a member of the given team id without querying the database."""
+    def add(account_id, team_id):
+        auth.memberships[(account_id, str(team_id))] = monotonic() + auth.MEMBERSHIP_TTL
+    return add
+
+
+@pytest.fixture
+def database(app):
+    if not getenv("TEST_DATABASE_URI"):
+        pytest.skip("TEST_DATABASE_URI is not set")
+    db.drop_all()
+    db.create_all()
+    yield db
+    db.session.remove()
+
+
+@pytest.fixture
+def team(database):
+    """Returns a team of account 1 with eight players, rated from 3.0 to 6.5, and a match with all of them in its
+       pool, as (team, players, match)."""
+    database.session.add(Account(account_id=1, email="one@example.com", password="x"))
+    team = Team(name="Team", members=[1], pending=[])
+    database.session.add(team)
+    database.session.flush()
+    players = [Player(name=f"Player {i}", team=team.team_id, initial_rating=3 + i / 2, current_rating=3 + i / 2)
+               for i in range(8)]
+    database.session.add_all(players)
+    database.session.flush()
+    match = Match(date=date(2024, 1, 1), team=team.team_id, pool=[player.player_id for player in players])
+    database.session.add(match)
+    database.session.commit()
+    return team, players, match
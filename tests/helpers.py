@@ -0,0 +1,36 @@
+"""Random pools and every line-up of them, to check the engines against."""
+from itertools import combinations
+from random import Random
+
+
+POOL_SIZES = range(2, 15, 2)
+
+
+def pools(count=6, seed=0):
+    rng = Random(seed)
+    return [[rng.randint(30, 70) for _ in range(pool_size)] for pool_size in POOL_SIZES for _ in range(count)]
+
+
+def lineups(ratings, allowed=None):
+    """Returns the difference of every line-up of the pool by mask, keeping the last player in team0
+       unless allowed, a function of the mask, is given, in which case every split it allows is kept."""
+    pool_size = len(ratings)
+    players = range(pool_size) if allowed else range(pool_size - 1)
+    found = {}
+    for team1 in combinations(players, pool_size // 2):
+        mask = sum(1 << i for i in team1)
+        if allowed is None or allowed(mask):
+            found[mask] = abs(sum(ratings) - 2 * sum(ratings[i] for i in team1))
+    return found
+
+
+def check(solution, found, pool_size=None):
+    """Checks a Solution against the line-ups found. Given the pool size, masks with the last player in team1, as
+       the solver cache returns once the player it keeps in team0 has moved, are swapped around first."""
+    fairest = min(found.values())
+    mask = solution.mask
+    if pool_size and (mask >> (pool_size - 1)) & 1:
+        mask ^= (1 << pool_size) - 1
+    assert solution.difference == fairest
+    assert solution.parsed == sum(difference == fairest for difference in found.values())
+    assert found.get(mask) == fairest
@@ -0,0 +1,51 @@
+"""Checks that pools scored together match the vectorized engine, and the results of batch calculate-teams."""
+from datetime import date
+
+import pytest
+
+import engines
+from helpers import POOL_SIZES, pools
+from models import Match
+
+
+def test_vectorized_many_matches_vectorized():
+    for pool_size in POOL_SIZES:
+        group = [ratings for ratings in pools(seed=pool_size) if len(ratings) == pool_size]
+        seeds = list(range(len(group)))
+        assert engines.vectorized_many(group, seeds) == [engines.solve(ratings, 'vectorized', seed)
+                                                         for ratings, seed in zip(group, seeds)]
+
+
+@pytest.mark.parametrize("body", [{}, {"items": []}, {"items": {"team_id": 1}}, {"items": [[1, 2]]},
+                                  {"items": [{"team_id": 1, "match_id": "2"}]},
+                                  {"items": [{"team_id": 1, "match_id": 2}] * 101}])
+def test_batches_must_be_items_of_team_and_match_ids(client, login, body):
+    response = client.post("/batch/calculate-teams", json=body, headers=login(1))
+    assert response.status_code == 404
+
+
+def test_each_item_of_a_batch_has_its_status(client, login, database, team):
+    first, players, match = team
+    other = Match(date=date(2024, 1, 8), team=first.team_id)
+    database.session.add(other)
+    database.session.commit()
+    ids = [player.player_id for player in players]
+    items = [{"team_id": first.team_id, "match_id": other.match_id, "pool": ids[:3]},
+             {"team_id": first.team_id, "match_id": other.match_id, "pool": [player.name for player in players[:4]],
+              "seed": "a"},
+             {"team_id": first.team_id, "match_id": other.match_id, "pool": ids[:4]},
+             {"team_id": first.team_id + 1, "match_id": match.match_id, "pool": ids},
+             {"team_id": first.team_id, "match_id": match.match_id + other.match_id, "pool": ids},
+             {"team_id": first.team_id, "match_id": match.match_id, "pool": ids, "seed": 1.5},
+             {"team_id": first.team_id, "match_id": match.match_id, "pool": ids + [0]},
+             {"team_id": first.team_id, "match_id": match.match_id, "pool": ids, "seed": 1}]
+    response = client.post("/batch/calculate-teams", json={"items": items}, headers=login(1))
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert [result["status"] for result in results] == [404, 200, 404, 404, 404, 404, 404, 200]
+    assert [result["msg"] for result in results if result["status"] == 404] == [
+        'Pool must be an equal number', 'Match is already in the batch',
+        'Team not found (does it exist and are you a member?)', 'Match not found',
+        'Seed must be an integer or a string', "Pool must be a subset of a team's players"]
+    assert response.json["msg"] == '2 of 8 matches calculated'
+    assert sorted(other.team0 + other.team1) == ids[:4] and sorted(match.team0 + match.team1) == ids
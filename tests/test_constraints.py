@@ -0,0 +1,74 @@
+"""Checks the constrained engine against enumerating the line-ups that keep the constraints, and the
+validation of the constraints given to calculate-teams."""
+from random import Random
+
+import pytest
+
+import engines
+from helpers import check, lineups, pools
+from main import pool_constraints
+from models import Player
+
+
+def test_constrained_engine_keeps_the_constraints():
+    rng = Random(1)
+    for seed, ratings in enumerate(pools()):
+        pool_size = len(ratings)
+        if pool_size < 4:
+            continue
+        players = rng.sample(range(pool_size), 4)
+        constraints = {"together": [players[:2]], "apart": [players[2:]], "team0": [], "team1": []}
+        if seed % 2:
+            constraints["team0" if seed % 4 == 1 else "team1"].append(rng.randrange(pool_size))
+        fixed = constraints["team0"] or constraints["team1"]
+
+        def allowed(mask):
+            sides = [(mask >> i) & 1 for i in range(pool_size)]
+            return (sides[players[0]] == sides[players[1]] and sides[players[2]] != sides[players[3]]
+                    and all(not sides[i] for i in constraints["team0"]) and all(sides[i] for i in constraints["team1"])
+                    and (fixed or not sides[-1]))
+
+        found = lineups(ratings, allowed)
+        if not found:
+            with pytest.raises(ValueError):
+                engines.solve(ratings, seed=seed, constraints=constraints)
+            continue
+        check(engines.solve(ratings, seed=seed, constraints=constraints), found)
+
+
+def test_pool_constraints_are_indexes_into_the_pool():
+    players = [Player(player_id=player_id, name=name) for player_id, name in ((4, "Ann"), (7, "Bo"), (9, "Cy"))]
+    assert pool_constraints({"together": [[4, "Bo"]], "apart": [["Ann", 9]], "team1": ["Cy"]}, players) == {
+        "together": [[0, 1]], "apart": [[0, 2]], "team0": [], "team1": [2]}
+
+
+@pytest.mark.parametrize("constraints", [
+    [[4, 7]],
+    {"together": [[4, 7]], "besides": []},
+    {"together": [4, 7]},
+    {"together": "4, 7"},
+    {"apart": [[4, 7, 9]]},
+    {"team0": 4},
+    {"team1": [4.0]},
+    {"together": [[4, None]]},
+    {"together": [[4, 5]]},
+    {"team0": ["Dee"]},
+])
+def test_pool_constraints_reject_bad_shapes_and_players(constraints):
+    players = [Player(player_id=player_id, name=name) for player_id, name in ((4, "Ann"), (7, "Bo"), (9, "Cy"))]
+    with pytest.raises(ValueError):
+        pool_constraints(constraints, players)
+
+
+def test_calculate_teams_validates_constraints(client, login, team):
+    _, players, match = team
+    url = f"/team/{match.team}/{match.match_id}/calculate-teams"
+    for body in ({"constraints": {"apart": [[players[0].player_id]]}},
+                 {"constraints": {"team0": [players[0].player_id]}, "teams": 4}):
+        response = client.patch(url, json=body, headers=login(1))
+        assert response.status_code == 404
+    assert response.json["msg"] == 'Constraints can only be used with 2 teams'
+    response = client.patch(url, json={"constraints": {"apart": [[players[0].player_id, players[1].player_id]]}},
+                            headers=login(1))
+    assert response.status_code == 200
+    assert (players[0].player_id in match.team0) != (players[1].player_id in match.team0)
@@ -0,0 +1,53 @@
+"""Checks the engines against enumerating every line-up of small random pools.
+
+Run from the root of the repository with ``python -m pytest``.
+"""
+from random import Random
+
+import pytest
+
+import engines
+from helpers import check, lineups, pools
+
+
+@pytest.mark.parametrize("engine", [None, *engines.ENGINES])
+def test_engines_find_the_fairest_lineups(engine):
+    for seed, ratings in enumerate(pools()):
+        solution = engines.solve(ratings, engine, seed)
+        check(solution, lineups(ratings))
+        assert solution.total == engines.total_options(len(ratings))
+
+
+@pytest.mark.parametrize("engine", ["brute-force", "streaming"])
+def test_scanning_engines_refuse_pools_over_the_limit(engine):
+    ratings = [50] * (engines.MAX_SCAN_POOL_SIZE + 2)
+    with pytest.raises(ValueError):
+        engines.solve(ratings, engine)
+    assert engines.solve(ratings).difference == 0
+
+
+def test_time_budget_only_picks_parallel_when_too_short_for_the_exact_engines():
+    ratings = [Random(size).randrange(10 ** 6) for size in range(30)]
+    assert engines.choose_engine(ratings) == 'meet-in-the-middle'
+    assert engines.choose_engine(ratings, 1000) == 'meet-in-the-middle'
+    assert engines.choose_engine(ratings, 10) == 'parallel'
+    assert engines.choose_engine([50] * 30, 10) == 'counting'
+
+
+def test_parallel_needs_a_time_budget_over_the_limit(monkeypatch):
+    monkeypatch.setattr(engines, "SEARCH_WORKERS", 1)
+    ratings = [Random(size).randint(30, 70) for size in range(engines.MAX_SCAN_POOL_SIZE + 2)]
+    with pytest.raises(ValueError):
+        engines.solve(ratings, 'parallel')
+    solution = engines.solve(ratings, 'parallel', time_budget_ms=50)
+    assert 0 < solution.coverage < 1
+    assert bin(solution.mask).count("1") == len(ratings) // 2
+    assert solution.difference == abs(sum(ratings) - 2 * sum(rating for i, rating in enumerate(ratings)
+                                                               if (solution.mask >> i) & 1))
+
+
+@pytest.mark.parametrize("engine", [None, *engines.ENGINES])
+def test_seeds_repeat_the_lineup_picked(engine):
+    ratings = [Random(size).randint(30, 35) for size in range(12)]
+    for seed in (0, 1, "match 1"):
+        assert engines.solve(ratings, engine, seed).mask == engines.solve(ratings, engine, seed).mask
@@ -0,0 +1,33 @@
+"""Checks the solver cache against enumerating every line-up of the pools of matches as they change."""
+from random import Random
+
+from helpers import check, lineups
+from incremental import SolverCache
+
+
+def test_solver_cache_follows_pool_changes():
+    rng = Random(2)
+    cache = SolverCache(4)
+    for match_id in range(4):
+        pool = {player: rng.randint(30, 70) for player in range(rng.choice([8, 10, 12]))}
+        for _ in range(6):
+            ratings = list(pool.values())
+            check(cache.solve(match_id, dict(pool), rng), lineups(ratings), len(ratings))
+            player = rng.choice(list(pool))
+            change = rng.randrange(3 if len(pool) < 14 else 2)
+            if change == 0:
+                pool[player] = rng.randint(30, 70)
+            elif change == 1:
+                del pool[player]
+                pool[max(pool) + 1] = rng.randint(30, 70)
+            else:
+                pool[max(pool) + 1], pool[max(pool) + 2] = rng.randint(30, 70), rng.randint(30, 70)
+
+
+def test_solver_cache_keeps_the_latest_pools_and_forgets_changed_players():
+    cache = SolverCache(2)
+    for match_id in range(3):
+        cache.solve(match_id, {match_id * 10 + player: 50 + player for player in range(4)}, Random(match_id))
+    assert list(cache.states) == [1, 2]
+    cache.invalidate([11, 99])
+    assert list(cache.states) == [2]
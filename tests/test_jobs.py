@@ -0,0 +1,73 @@
+"""Checks background calculate-teams jobs, from queueing to polling for their result."""
+from concurrent.futures import Future
+
+import pytest
+from sqlalchemy import func, select
+
+from jobs import claim, finish, pick_teams
+from models import Job
+
+
+def done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_pick_teams_splits_the_pool_of_player_ids():
+    fields, response = pick_teams(1, [11, 12, 13, 14], [50, 40, 45, 45], {"seed": 0, "time_budget_ms": 100})
+    assert sorted(fields["team0"] + fields["team1"]) == [11, 12, 13, 14] and fields["teams"] == []
+    assert response["total options"] == 3 and response["coverage"] == 1
+    fields, response = pick_teams(2, [11, 12, 13, 14, 15, 16], [50, 40, 45, 45, 30, 60], {"teams": 3})
+    assert fields["team0"] == fields["team1"] == [] and len(fields["teams"]) == 3
+    assert response["spread"] == 0
+
+
+@pytest.mark.parametrize("wait", ["nan", "inf", "-inf", "soon"])
+def test_waits_must_be_a_number_of_seconds(client, login, member, wait):
+    member(1, 1)
+    response = client.get(f"/team/1/jobs/1?wait={wait}", headers=login(1))
+    assert response.status_code == 404
+    assert response.json["msg"] == 'Wait must be a number of seconds'
+
+
+def test_the_same_calculation_is_queued_once(client, login, database, team):
+    _, _, match = team
+    url = f"/team/{match.team}/{match.match_id}/calculate-teams"
+    first = client.patch(url, json={"background": True, "seed": 1}, headers=login(1))
+    again = client.patch(url, json={"background": True, "seed": 1}, headers=login(1))
+    other = client.patch(url, json={"background": True, "seed": 2}, headers=login(1))
+    assert first.status_code == again.status_code == other.status_code == 202
+    assert first.json["job"]["job_id"] == again.json["job"]["job_id"] != other.json["job"]["job_id"]
+    assert first.headers["Location"] == f"/team/{match.team}/jobs/{first.json['job']['job_id']}"
+    assert database.session.execute(select(func.count(Job.job_id))).scalar() == 2
+
+
+def test_finished_jobs_save_their_teams(client, login, database, team):
+    _, _, match = team
+    response = client.patch(f"/team/{match.team}/{match.match_id}/calculate-teams", json={"background": True},
+                            headers=login(1))
+    url = response.headers["Location"]
+    assert client.get(url, headers=login(1)).status_code == 202
+    [(job_id, *job)] = claim(1)
+    finish(job_id, done(pick_teams(*job)))
+    response = client.get(f"{url}?wait=1", headers=login(1))
+    assert response.status_code == 200
+    assert response.json["job"]["status"] == 'done'
+    assert sorted(match.team0 + match.team1) == sorted(match.pool)
+
+
+def test_jobs_of_changed_or_deleted_matches_are_not_saved(client, login, database, team):
+    _, players, match = team
+    url = f"/team/{match.team}/{match.match_id}"
+    client.patch(f"{url}/calculate-teams", json={"background": True}, headers=login(1))
+    [(job_id, *job)] = claim(1)
+    client.patch(f"{url}/update-pool", json={"pool": [player.player_id for player in players[:4]]}, headers=login(1))
+    finish(job_id, done(pick_teams(*job)))
+    assert database.session.get(Job, job_id).status == 'failed'
+    assert match.team0 == []
+    client.patch(f"{url}/calculate-teams", json={"background": True}, headers=login(1))
+    [(job_id, *job)] = claim(1)
+    assert client.delete(url, headers=login(1)).status_code == 200
+    finish(job_id, done(pick_teams(*job)))
+    assert database.session.get(Job, job_id) is None
@@ -0,0 +1,63 @@
+"""Checks top_k and the lineups route."""
+from datetime import date
+from json import loads
+from random import Random
+
+import pytest
+
+import engines
+from helpers import lineups, pools
+from models import Team, Player, Match
+
+
+def test_top_k_lists_the_fairest_lineups_in_order():
+    for ratings in pools(count=3):
+        found = lineups(ratings)
+        listed = list(engines.top_k(ratings, len(found) + 1))
+        assert [difference for difference, _ in listed] == sorted(found.values())
+        assert all(found[mask] == difference for difference, mask in listed)
+        assert len({mask for _, mask in listed}) == len(found)
+
+
+def test_top_k_refuses_pools_too_large_to_score():
+    rng = Random(3)
+    with pytest.raises(ValueError):
+        engines.top_k([rng.randrange(10 ** 6) for _ in range(30)], 10)
+    assert len(list(engines.top_k([rng.randint(30, 70) for _ in range(30)], 10))) == 10
+
+
+def test_lineups_streams_the_fairest_first(client, login, team):
+    _, players, match = team
+    response = client.get(f"/team/{match.team}/{match.match_id}/lineups?k=3", headers=login(1))
+    assert response.status_code == 200
+    listed = [loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [lineup["rank"] for lineup in listed] == [1, 2, 3]
+    assert [lineup["difference"] for lineup in listed] == sorted(lineup["difference"] for lineup in listed)
+    assert all(len(lineup["team0"]) == len(lineup["team1"]) == len(players) // 2 for lineup in listed)
+
+
+def test_lineups_only_lists_matches_and_players_of_the_team(client, login, database, team):
+    first, players, match = team
+    second = Team(name="Second", members=[1], pending=[])
+    database.session.add(second)
+    database.session.flush()
+    others = [Player(name=f"Other {i}", team=second.team_id, initial_rating=5, current_rating=5) for i in range(2)]
+    database.session.add_all(others)
+    database.session.flush()
+    other_match = Match(date=date(2024, 1, 1), team=second.team_id, pool=[player.player_id for player in others])
+    match.pool = match.pool[:4] + [player.player_id for player in others]
+    database.session.add(other_match)
+    database.session.commit()
+    assert client.get(f"/team/{first.team_id}/{other_match.match_id}/lineups", headers=login(1)).status_code == 404
+    response = client.get(f"/team/{first.team_id}/{match.match_id}/lineups?k=1", headers=login(1))
+    fairest = loads(response.get_data(as_text=True))
+    assert sorted(fairest["team0"] + fairest["team1"]) == sorted(player.name for player in players[:4])
+
+
+def test_lineups_refuses_pools_too_large_to_score(client, login, team, monkeypatch):
+    _, _, match = team
+    monkeypatch.setattr(engines, "MAX_COUNTING_CELLS", 0)
+    monkeypatch.setattr(engines.tables, "MAX_POOL_SIZE", 6)
+    response = client.get(f"/team/{match.team}/{match.match_id}/lineups", headers=login(1))
+    assert response.status_code == 404
+    assert "can only be listed" in response.json["msg"]
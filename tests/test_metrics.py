@@ -0,0 +1,22 @@
+"""Checks that /metrics is only served with METRICS_TOKEN, and what it reports."""
+import engines
+
+
+def test_metrics_are_not_served_without_the_token(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+    monkeypatch.setenv("METRICS_TOKEN", "token")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code == 404
+
+
+def test_metrics_report_requests_and_engines(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "token")
+    client.get("/")
+    engines.solve([50, 51, 52, 53])
+    response = client.get("/metrics", headers={"Authorization": "Bearer token"})
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in body
+    assert 'engine_phase_seconds_count{engine="vectorized",phase="scoring"}' in body
@@ -0,0 +1,52 @@
+"""Checks the multi-team partitioner against enumerating every split of small random pools, and the
+teams of matches split into more than two."""
+from itertools import combinations
+from random import Random
+
+import pytest
+
+import multiteam
+
+
+def partitions(players, teams):
+    """Yields every split of the players into the given number of equal teams, ignoring their order."""
+    if teams == 1:
+        yield [list(players)]
+        return
+    first, rest = players[0], players[1:]
+    for others in combinations(rest, len(players) // teams - 1):
+        team = [first, *others]
+        for split in partitions([player for player in rest if player not in others], teams - 1):
+            yield [team, *split]
+
+
+@pytest.mark.parametrize("pool_size,teams", [(6, 3), (8, 4), (9, 3), (12, 3), (12, 4)])
+def test_partition_finds_the_lowest_spread(pool_size, teams):
+    rng = Random(pool_size * teams)
+    for _ in range(5):
+        ratings = [rng.randint(30, 70) for _ in range(pool_size)]
+        found = multiteam.partition(ratings, teams)
+        assert sorted(player for team in found.teams for player in team) == list(range(pool_size))
+        assert all(len(team) == pool_size // teams for team in found.teams)
+        assert found.spread == multiteam.spread(ratings, found.teams)
+        lowest = min(multiteam.spread(ratings, split) for split in partitions(list(range(pool_size)), teams))
+        assert found.spread >= lowest
+        if found.exact:
+            assert found.spread == lowest
+
+
+def test_splits_into_more_teams_replace_team0_and_team1(client, login, team):
+    _, players, match = team
+    url = f"/team/{match.team}/{match.match_id}"
+    response = client.patch(f"{url}/calculate-teams", json={"teams": 4}, headers=login(1))
+    assert response.status_code == 200
+    assert match.team0 == match.team1 == []
+    assert sorted(player for split in match.teams for player in split) == sorted(match.pool)
+    response = client.patch(f"{url}/declare-winner", json={"winner": 0}, headers=login(1))
+    assert response.status_code == 404
+    assert match.winner is None
+    ids = [player.player_id for player in players]
+    response = client.patch(f"{url}/update-teams", json={"team0": ids[:4], "team1": ids[4:]}, headers=login(1))
+    assert response.status_code == 200
+    assert match.teams == []
+    assert client.patch(f"{url}/calculate-teams", json={"teams": 3}, headers=login(1)).status_code == 404
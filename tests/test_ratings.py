@@ -0,0 +1,71 @@
+"""Checks that declaring and removing winners changes ratings through the rating ledger."""
+from decimal import Decimal
+
+from sqlalchemy import func, select, update
+
+from models import Player, RatingChange
+
+
+def ratings(database):
+    return dict(database.session.execute(select(Player.player_id, Player.current_rating)).all())
+
+
+def ledger(database):
+    return database.session.execute(select(RatingChange.match, RatingChange.player, RatingChange.change)
+                                    .order_by(RatingChange.change_id)).all()
+
+
+def split(client, login, match, players):
+    ids = [player.player_id for player in players]
+    response = client.patch(f"/team/{match.team}/{match.match_id}/update-teams",
+                            json={"team0": ids[:4], "team1": ids[4:]}, headers=login(1))
+    assert response.status_code == 200
+    return ids
+
+
+def test_declaring_and_removing_a_winner_is_recorded_and_reversed(client, login, database, team):
+    _, players, match = team
+    ids = split(client, login, match, players)
+    before = ratings(database)
+    url = f"/team/{match.team}/{match.match_id}/declare-winner"
+    assert client.patch(url, json={"winner": 0}, headers=login(1)).status_code == 200
+    after = ratings(database)
+    assert all(after[player] == before[player] + Decimal("0.1") for player in ids[:4])
+    assert all(after[player] == before[player] - Decimal("0.1") for player in ids[4:])
+    assert sorted(ledger(database)) == sorted([(match.match_id, player, Decimal("0.1")) for player in ids[:4]] +
+                                              [(match.match_id, player, Decimal("-0.1")) for player in ids[4:]])
+    assert client.delete(url, headers=login(1)).status_code == 200
+    assert ratings(database) == before
+    assert len(ledger(database)) == 16
+    assert database.session.execute(select(func.sum(RatingChange.change))).scalar() == 0
+
+
+def test_removing_a_winner_declared_before_the_ledger_records_its_reversal(client, login, database, team):
+    _, players, match = team
+    ids = split(client, login, match, players)
+    before = ratings(database)
+    database.session.execute(update(Player).where(Player.player_id.in_(ids[:4])).values(
+        current_rating=Player.current_rating - Decimal("0.1")))
+    database.session.execute(update(Player).where(Player.player_id.in_(ids[4:])).values(
+        current_rating=Player.current_rating + Decimal("0.1")))
+    match.winner = 1
+    database.session.commit()
+    url = f"/team/{match.team}/{match.match_id}/declare-winner"
+    assert client.delete(url, headers=login(1)).status_code == 200
+    assert ratings(database) == before
+    assert len(ledger(database)) == 16
+    assert client.patch(url, json={"winner": 0}, headers=login(1)).status_code == 200
+    assert client.delete(url, headers=login(1)).status_code == 200
+    assert ratings(database) == before
+
+
+def test_deleting_a_match_keeps_its_rating_changes(client, login, database, team):
+    _, players, match = team
+    split(client, login, match, players)
+    url = f"/team/{match.team}/{match.match_id}"
+    assert client.patch(f"{url}/declare-winner", json={"winner": 0}, headers=login(1)).status_code == 200
+    assert client.delete(url, headers=login(1)).status_code == 404
+    assert client.delete(f"{url}/declare-winner", headers=login(1)).status_code == 200
+    assert client.delete(url, headers=login(1)).status_code == 200
+    changes = ledger(database)
+    assert len(changes) == 16 and all(match_id is None for match_id, _, _ in changes)
@@ -0,0 +1,40 @@
+"""Checks the ETags, 304s and cached bodies of get_team and get_match, and the schema upgrade script."""
+from pathlib import Path
+
+from responses import ResponseCache
+
+
+def test_response_cache_keeps_the_latest_bodies():
+    cache = ResponseCache(2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+
+
+def test_unchanged_teams_and_matches_return_304(client, login, team):
+    _, players, match = team
+    for url in (f"/team/{match.team}", f"/team/{match.team}/{match.match_id}"):
+        response = client.get(url, headers=login(1))
+        assert response.status_code == 200 and response.headers["ETag"]
+        tag = response.headers["ETag"]
+        unchanged = client.get(url, headers={**login(1), "If-None-Match": tag})
+        assert unchanged.status_code == 304 and unchanged.data == b""
+        assert client.get(url, headers=login(1)).data == response.data
+        pool = [player.player_id for player in players[:4]]
+        assert client.patch(f"/team/{match.team}/{match.match_id}/update-pool", json={"pool": pool},
+                            headers=login(1)).status_code == 200
+        changed = client.get(url, headers={**login(1), "If-None-Match": tag})
+        assert changed.status_code == 200 and changed.headers["ETag"] != tag
+
+
+def test_upgrade_script_runs_on_an_upgraded_database(database):
+    script = (Path(__file__).parent.parent / "migrations" / "upgrade.sql").read_text()
+    for _ in range(2):
+        connection = database.engine.raw_connection()
+        try:
+            connection.cursor().execute(script)
+            connection.commit()
+        finally:
+            connection.close()